@@ -1,34 +1,78 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
-from PIL import Image, ImageTk
 import os
+import re
+import queue
+import shutil
+import tempfile
+import threading
 
 # Import logic modules
 from lossless_algorithms import LosslessLogic
-from lossy_algorithms import LossyLogic
-
+from instrumentation import CompressionStats
+
+# The lossy stack (NumPy, PIL, ImageTk) is imported on first use of the
+# lossy screen, so text compression starts without it
+Image = ImageTk = LossyLogic = None
+
+
+def load_lossy_stack():
+    global Image, ImageTk, LossyLogic
+    if LossyLogic is None:
+        from PIL import Image, ImageTk
+        from lossy_algorithms import LossyLogic
+
+# Lossy level dropdowns (per method)
+QUANT_LEVELS = [
+    "Near Lossless (8 bits)",
+    "Very Minimal Compression (7 bits)",
+    "Minimal Compression (6 bits)",
+    "Light Compression (5 bits)",
+    "Very Low Compression (4 bits)",
+    "Low Compression (3 bits)",
+    "Medium Compression (2 bits)",
+    "High Compression (1 bit)"
+]
+DCT_LEVELS = [
+    "Low Compression (Quality 90)",
+    "Medium Compression (Quality 50)",
+    "High Compression (Quality 20)"
+]
 
 class DataCompressionApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Data Compression Project")
         self.root.geometry("1000x800")
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         
         # State variables
         self.file_path = None
         self.file_content = None
         self.decomp_file_content = None
-        self.decompressed_text = None
+        self.decompressed_path = None # Temp file the decoder streams into
         
         self.image_path = None
         self.original_image = None
         self.compressed_image = None
+        self.rd_sweep = None
+        self.gray_histogram = None # Shared by the sweep and the previews
+        self.lossy_mse = 0.0
+        self.preview_image = None
+        
+        # Progressive lossy runs: full-resolution passes finish on a worker
+        # thread; results are cached per (method, level) for the current image
+        self.lossy_cache = {}
+        self.lossy_key = None
+        self.lossy_running = set()
+        self.lossy_results = queue.Queue()
         
         # Checkbox variables (Compression)
         self.chk_rle_var = tk.BooleanVar()
         self.chk_huff_var = tk.BooleanVar()
         self.chk_golomb_var = tk.BooleanVar()
         self.chk_lzw_var = tk.BooleanVar()
+        self.chk_lz77_var = tk.BooleanVar()
         
         # Radio variable (Decompression)
         self.decomp_algo_var = tk.StringVar(value="")
@@ -44,6 +88,7 @@ class DataCompressionApp:
         self.show_home()
 
     def clear_frame(self):
+        self.lossy_key = None # Stop swapping lossy results into destroyed widgets
         for widget in self.container.winfo_children():
             widget.destroy()
 
@@ -108,6 +153,7 @@ class DataCompressionApp:
         tk.Checkbutton(left_frame, text="Huffman Coding", variable=self.chk_huff_var, font=("Arial", 11), command=self.check_lossless_ready).pack(anchor="w", padx=10, pady=5)
         tk.Checkbutton(left_frame, text="Golomb Coding", variable=self.chk_golomb_var, font=("Arial", 11), command=self.check_lossless_ready).pack(anchor="w", padx=10, pady=5)
         tk.Checkbutton(left_frame, text="LZW Coding", variable=self.chk_lzw_var, font=("Arial", 11), command=self.check_lossless_ready).pack(anchor="w", padx=10, pady=5)
+        tk.Checkbutton(left_frame, text="LZ77 / LZSS Coding", variable=self.chk_lz77_var, font=("Arial", 11), command=self.check_lossless_ready).pack(anchor="w", padx=10, pady=5)
 
         # Right: Upload
         right_frame = ttk.LabelFrame(main_frame, text="2. Upload Text File")
@@ -147,7 +193,7 @@ class DataCompressionApp:
 
     def check_lossless_ready(self):
         any_algo = (self.chk_rle_var.get() or self.chk_huff_var.get() or 
-                    self.chk_golomb_var.get() or self.chk_lzw_var.get())
+                    self.chk_golomb_var.get() or self.chk_lzw_var.get() or self.chk_lz77_var.get())
         if any_algo and self.file_path:
             self.btn_compress_lossless.config(state=tk.NORMAL)
         else:
@@ -171,15 +217,19 @@ class DataCompressionApp:
         notebook.pack(fill="both", expand=True, padx=5, pady=5)
 
         # --- Helper Function to Create Tabs ---
-        def create_tab(algo_name, encoded_package):
-            theoretical_size = LosslessLogic.calculate_theoretical_size(encoded_package)
-            
-            if theoretical_size > 0:
-                cr = original_size_bytes / theoretical_size
-            else:
-                cr = 0.0
-            
-            physical_size = len(encoded_package.encode('utf-8'))
+        def create_tab(row):
+            # Sizes and CR were measured by the worker that ran the codec
+            algo_name, stats = row["algo"], row["stats"]
+            if row["error"]:
+                tab_frame = tk.Frame(notebook, bg="#f5f5f5")
+                notebook.add(tab_frame, text=algo_name)
+                tk.Label(tab_frame, text=f"{algo_name} failed on this input:\n{row['error']}", fg="#d32f2f",
+                         bg="#f5f5f5", font=("Arial", 10), justify="left", wraplength=600).pack(padx=10, pady=20)
+                return
+            encoded_package = row["package"].serialize() # For the preview and download
+            theoretical_size = row["theoretical_size"]
+            cr = row["cr"]
+            physical_size = row["physical_size"]
 
             # Tab Frame
             tab_frame = tk.Frame(notebook, bg="#f5f5f5")
@@ -194,6 +244,10 @@ class DataCompressionApp:
             tk.Label(info_frame, text=f"(File: {physical_size} B)", bg="#e0e0e0", fg="gray", font=("Arial", 8)).pack(side="left", padx=5)
             tk.Label(info_frame, text=f"CR: {cr:.2f}", font=("Arial", 10, "bold"), fg="#d32f2f", bg="#e0e0e0").pack(side="left", padx=10)
 
+            # Stage Stats Panel
+            if stats is not None:
+                self.make_stats_panel(tab_frame, stats).pack(fill="x", padx=10, pady=(5, 0))
+
             # Text Display Area
             txt_scroll = scrolledtext.ScrolledText(tab_frame, wrap=tk.WORD, height=10, font=("Consolas", 10))
             txt_scroll.pack(fill="both", expand=True, padx=10, pady=10)
@@ -226,29 +280,28 @@ class DataCompressionApp:
             btn_dl = tk.Button(tab_frame, text=f"Download {algo_name} Result", bg="#4caf50", fg="white", command=download_output)
             btn_dl.pack(pady=10)
 
-        # 3. Run Algorithms
-        if self.chk_rle_var.get():
-            encoded = LosslessLogic.rle_compress(data)
-            create_tab("RLE", encoded)
-
-        if self.chk_huff_var.get():
-            encoded = LosslessLogic.huffman_compress(data)
-            create_tab("Huffman", encoded)
-
-        if self.chk_golomb_var.get():
-            encoded = LosslessLogic.golomb_compress(data)
-            create_tab("Golomb", encoded)
-
-        if self.chk_lzw_var.get():
-            encoded = LosslessLogic.lzw_compress(data)
-            create_tab("LZW", encoded)
+        # 3. Run the selected algorithms side by side (one process each)
+        selected = [algo for algo, var in (("RLE", self.chk_rle_var), ("Huffman", self.chk_huff_var),
+                                           ("Golomb", self.chk_golomb_var), ("LZW", self.chk_lzw_var),
+                                           ("LZ77", self.chk_lz77_var))
+                    if var.get()]
+        rows = LosslessLogic.compare_codecs(data, selected, with_stats=True)
+
+        # 4. Ranking first, then one tab per codec, best first
+        if len(rows) > 1:
+            ranking_frame = tk.Frame(notebook, bg="#f5f5f5")
+            notebook.add(ranking_frame, text="Ranking")
+            tk.Label(ranking_frame, text=LosslessLogic.comparison_table(rows, original_size_bytes),
+                     font=("Consolas", 10), justify="left", anchor="nw", bg="#f5f5f5").pack(fill="both", padx=10, pady=10)
+        for row in rows:
+            create_tab(row)
 
     # --- SCREEN: LOSSLESS DECOMPRESSION ---
     def show_decompression(self):
         self.clear_frame()
         self.file_path = None
         self.decomp_file_content = None
-        self.decompressed_text = None
+        self.discard_decompressed_file()
         self.decomp_algo_var.set("")
 
         top_frame = tk.Frame(self.container)
@@ -267,6 +320,7 @@ class DataCompressionApp:
         tk.Radiobutton(left_frame, text="Huffman Coding", variable=self.decomp_algo_var, value="Huffman", font=("Arial", 11), command=self.check_decomp_ready).pack(anchor="w", padx=10, pady=5)
         tk.Radiobutton(left_frame, text="Golomb Coding", variable=self.decomp_algo_var, value="Golomb", font=("Arial", 11), command=self.check_decomp_ready).pack(anchor="w", padx=10, pady=5)
         tk.Radiobutton(left_frame, text="LZW Coding", variable=self.decomp_algo_var, value="LZW", font=("Arial", 11), command=self.check_decomp_ready).pack(anchor="w", padx=10, pady=5)
+        tk.Radiobutton(left_frame, text="LZ77 / LZSS Coding", variable=self.decomp_algo_var, value="LZ77", font=("Arial", 11), command=self.check_decomp_ready).pack(anchor="w", padx=10, pady=5)
 
         # Right: Upload
         right_frame = ttk.LabelFrame(main_frame, text="2. Upload Text File")
@@ -296,6 +350,9 @@ class DataCompressionApp:
                                              state=tk.DISABLED, command=self.save_decompressed_text)
         self.btn_download_decomp.pack(pady=5)
 
+        self.lbl_decomp_stats = self.make_stats_panel(preview_frame)
+        self.lbl_decomp_stats.pack(fill="x", padx=5, pady=(0, 5))
+
     def upload_compressed_file(self):
         path = filedialog.askopenfilename(filetypes=[("Text Files", "*.txt"), ("All Files", "*.*")])
         if path:
@@ -318,45 +375,56 @@ class DataCompressionApp:
     def perform_decompression(self):
         algo = self.decomp_algo_var.get()
         data = self.decomp_file_content
-        text = ""
+        self.discard_decompressed_file()
+        self.btn_download_decomp.config(state=tk.DISABLED)
         
         try:
-            if algo == "RLE":
-                text = LosslessLogic.rle_decompress(data)
-            elif algo == "Huffman":
-                text = LosslessLogic.huffman_decompress(data, {})
-            elif algo == "Golomb":
-                text = LosslessLogic.golomb_decompress(data, 8, {})
-            elif algo == "LZW":
-                text = LosslessLogic.lzw_decompress(data)
+            # Stream into a temp file; only the preview is kept in memory
+            fd, path = tempfile.mkstemp(prefix="decompressed_", suffix=".txt")
+            os.close(fd)
+            self.decompressed_path = path
+            stats = CompressionStats(f"{algo} decompress")
+            with stats.session():
+                length, preview = LosslessLogic.decompress_to_file(algo, data, path, preview_chars=2000, stats=stats)
             
-            self.decompressed_text = text
+            self.lbl_decomp_stats.config(text=stats.summary())
             
             # Show Preview
             self.txt_preview.config(state=tk.NORMAL)
             self.txt_preview.delete(1.0, tk.END)
-            self.txt_preview.insert(tk.END, text[:2000] + ("\n...[Truncated]" if len(text) > 2000 else ""))
+            self.txt_preview.insert(tk.END, preview + ("\n...[Truncated]" if length > 2000 else ""))
             self.txt_preview.config(state=tk.DISABLED)
             
             self.btn_download_decomp.config(state=tk.NORMAL)
             
         except Exception as e:
+            self.discard_decompressed_file()
             messagebox.showerror("Decompression Error", f"Failed to decompress: {e}")
 
     def save_decompressed_text(self):
-        if self.decompressed_text:
+        if self.decompressed_path:
             f = filedialog.asksaveasfilename(defaultextension=".txt", filetypes=[("Text File", "*.txt")])
             if f:
-                with open(f, 'w', encoding='utf-8') as outfile:
-                    outfile.write(self.decompressed_text)
+                shutil.copyfile(self.decompressed_path, f)
                 messagebox.showinfo("Success", f"Saved to {os.path.basename(f)}")
 
+    def discard_decompressed_file(self):
+        if self.decompressed_path and os.path.exists(self.decompressed_path):
+            os.remove(self.decompressed_path)
+        self.decompressed_path = None
+
+    def on_close(self):
+        self.discard_decompressed_file()
+        self.root.destroy()
+
     # --- SCREEN: LOSSY COMPRESSION ---
     def show_lossy(self):
+        load_lossy_stack()
         self.clear_frame()
         self.image_path = None
         self.original_image = None
         self.compressed_image = None
+        self.reset_lossy_state()
         
         top_frame = tk.Frame(self.container)
         top_frame.pack(side="top", fill="x", padx=10, pady=10)
@@ -375,17 +443,24 @@ class DataCompressionApp:
         self.lbl_img_name = tk.Label(options_frame, text="No image selected", fg="gray")
         self.lbl_img_name.pack(side="left", padx=10)
 
+        # Dropdown for Method
+        tk.Label(options_frame, text="Method:").pack(side="left", padx=(20, 5))
+
+        self.combo_method = ttk.Combobox(options_frame, state="readonly", width=24)
+        self.combo_method['values'] = ["Non-Uniform Quantization", "DCT Transform Coding"]
+        self.combo_method.current(0)
+        self.combo_method.pack(side="left", padx=5)
+        self.combo_method.bind("<<ComboboxSelected>>", self.on_method_selected)
+
         # Dropdown for Compression Level
-        tk.Label(options_frame, text="Compression Level:").pack(side="left", padx=(40, 5))
+        tk.Label(options_frame, text="Compression Level:").pack(side="left", padx=(20, 5))
         
         self.combo_level = ttk.Combobox(options_frame, state="readonly", width=30)
-        self.combo_level['values'] = [
-            "Low Compression (3 bits)",
-            "Medium Compression (2 bits)",
-            "High Compression (1 bit)"
-        ]
-        self.combo_level.current(1) # Default to Low (3 bits)
+        self.combo_level['values'] = QUANT_LEVELS
+        self.combo_level.current(6) # Default to Medium (2 bits)
         self.combo_level.pack(side="left", padx=5)
+        # Once the sweep is cached, switching levels re-runs without retraining
+        self.combo_level.bind("<<ComboboxSelected>>", self.on_level_selected)
 
         self.btn_compress_lossy = tk.Button(options_frame, text="RUN COMPRESSION", 
                                              bg="#2196f3", fg="white", font=("Arial", 10, "bold"),
@@ -398,6 +473,14 @@ class DataCompressionApp:
         self.lbl_stats = tk.Label(self.stats_frame, text="MSE: N/A  |  CR: N/A", bg="#e3f2fd", font=("Arial", 11, "bold"))
         self.lbl_stats.pack(pady=5)
 
+        # Stage timings of the last full-resolution run
+        self.lbl_stage_stats = self.make_stats_panel(self.stats_frame)
+        self.lbl_stage_stats.pack(fill="x", padx=10)
+
+        # Rate-Distortion Curve (all bit depths from one training run)
+        self.rd_canvas = tk.Canvas(self.stats_frame, height=90, bg="white", highlightthickness=0)
+        self.rd_canvas.pack(fill="x", padx=10, pady=(0, 5))
+
         # Visuals
         self.vis_frame = tk.Frame(content_frame)
         self.vis_frame.pack(fill="both", expand=True, pady=10)
@@ -420,57 +503,198 @@ class DataCompressionApp:
             self.lbl_img_name.config(text=os.path.basename(path), fg="black")
             
             img = Image.open(path)
+            img.load() # Decode now; the worker thread reads it later
             display_img = img.copy()
             display_img.thumbnail((400, 350))
             self.tk_orig = ImageTk.PhotoImage(display_img)
             self.panel_orig.config(image=self.tk_orig, text="")
             self.original_image = img 
+            self.compressed_image = None
+            self.reset_lossy_state()
+            self.preview_image = display_img
             
             self.btn_compress_lossy.config(state=tk.NORMAL)
             self.panel_comp.config(image="", text="Compressed (Quantized) Image")
             self.btn_dl_lossy.config(state=tk.DISABLED)
             self.lbl_stats.config(text="MSE: N/A  |  CR: N/A")
+            self.rd_canvas.delete("all")
+
+    def reset_lossy_state(self):
+        self.rd_sweep = None
+        self.gray_histogram = None
+        self.preview_image = None
+        self.lossy_cache = {}
+        self.lossy_key = None
 
     def perform_lossy_compression(self):
         if not self.original_image:
             return
         
-        # Get bit size from dropdown
+        # Get bit size (or DCT quality) from dropdown
         selection = self.combo_level.get()
-        bit_depth = 3 # Default
-        if "4 bits" in selection: bit_depth = 4
-        elif "3 bits" in selection: bit_depth = 3
-        elif "2 bits" in selection: bit_depth = 2
-        elif "1 bit" in selection: bit_depth = 1
+        match = re.search(r"(\d+)", selection)
+        if self.is_dct_method():
+            key = ("dct", int(match.group(1)) if match else 50) # Default
+        else:
+            key = ("quant", int(match.group(1)) if match else 3) # Default
+        method, level = key
+        self.lossy_key = key
+
+        # Already computed for this image: swap in instantly
+        if key in self.lossy_cache:
+            self.show_cached_lossy(key)
+            return
         
         # Run Logic
         try:
-            # We now pass 'self.image_path' to get actual file size from disk
-            self.compressed_image, mse, cr = LossyLogic.run_quantization(
-                self.original_image, 
-                bit_depth, 
-                self.image_path
-            )
-            
-            # Update Stats
-            self.lbl_stats.config(text=f"MSE: {mse:.4f}  |  CR: {cr:.2f}")
-            
-            # Display Result
-            display_img = self.compressed_image.copy()
-            display_img.thumbnail((400, 350))
-            self.tk_comp = ImageTk.PhotoImage(display_img)
+            table = None
+            if method == "quant":
+                # One LBG run gives the tables of every bit depth
+                if self.rd_sweep is None:
+                    self.gray_histogram = LossyLogic.gray_histogram(self.original_image)
+                    self.rd_sweep = LossyLogic.rate_distortion_sweep(self.original_image, histogram=self.gray_histogram)
+                table = self.rd_sweep[level]["table"]
+                self.draw_rd_curve(level)
+
+            # 1. Preview first: downscaled pass with estimated MSE / CR
+            preview, mse, cr = LossyLogic.preview_compress(
+                self.original_image, level, self.image_path,
+                method=method, table=table, preview_image=self.preview_image,
+                histogram=self.gray_histogram)
+            self.tk_comp = ImageTk.PhotoImage(preview)
             self.panel_comp.config(image=self.tk_comp, text="")
-            
-            self.btn_dl_lossy.config(state=tk.NORMAL)
-            
+            self.lbl_stats.config(text=f"MSE (est.): {mse:.4f}  |  CR (est.): {cr:.2f}  |  full resolution running...")
+            self.btn_dl_lossy.config(state=tk.DISABLED)
         except Exception as e:
             messagebox.showerror("Compression Error", str(e))
+            return
+
+        # 2. Full resolution in the background, swapped in when done
+        if (key, id(self.original_image)) in self.lossy_running:
+            return
+        worker = threading.Thread(target=self.run_full_lossy_pass,
+                                  args=(key, self.original_image, self.image_path, table),
+                                  daemon=True)
+        if not self.lossy_running:
+            self.root.after(50, self.poll_lossy_results)
+        self.lossy_running.add((key, id(self.original_image)))
+        worker.start()
+
+    def run_full_lossy_pass(self, key, image, path, table):
+        # Worker thread: no Tk calls here, results go through the queue
+        method, level = key
+        try:
+            # DCT measures its coded stream; quant estimates (exact PNG size is measured on save)
+            extra = {} if method == "dct" else {"table": table, "size_estimate": "zlib"}
+            result = LossyLogic.run_with_stats(method, image, level, path, **extra)
+            self.lossy_results.put((key, image, result + (method != "dct",), None))
+        except Exception as e:
+            self.lossy_results.put((key, image, None, e))
+
+    def poll_lossy_results(self):
+        while True:
+            try:
+                key, image, result, error = self.lossy_results.get_nowait()
+            except queue.Empty:
+                break
+            self.lossy_running.discard((key, id(image)))
+            if image is not self.original_image:
+                continue # A new image was loaded meanwhile
+            if error is not None:
+                if key == self.lossy_key:
+                    messagebox.showerror("Compression Error", str(error))
+                continue
+            compressed_image, mse, cr, stats, estimated = result
+            display_img = compressed_image.copy()
+            display_img.thumbnail((400, 350))
+            self.lossy_cache[key] = (compressed_image, ImageTk.PhotoImage(display_img), mse, cr, estimated, stats)
+            if key == self.lossy_key:
+                self.show_cached_lossy(key)
+        if self.lossy_running:
+            self.root.after(50, self.poll_lossy_results)
+
+    def show_cached_lossy(self, key):
+        method, level = key
+        self.compressed_image, self.tk_comp, mse, cr, estimated, stats = self.lossy_cache[key]
+        self.panel_comp.config(image=self.tk_comp, text="")
+        self.lbl_stage_stats.config(text=stats.summary())
+        if method == "quant" and self.rd_sweep is not None:
+            self.draw_rd_curve(level)
+        self.show_lossy_stats(mse, cr, estimated)
+        self.btn_dl_lossy.config(state=tk.NORMAL)
+
+    def show_lossy_stats(self, mse, cr, estimated=False):
+        # Update Stats
+        self.lossy_mse = mse
+        cr_label = "CR (est.)" if estimated else "CR"
+        self.lbl_stats.config(text=f"MSE: {mse:.4f}  |  {cr_label}: {cr:.2f}")
+
+    def is_dct_method(self):
+        return self.combo_method.get() == "DCT Transform Coding"
+
+    def on_method_selected(self, event=None):
+        if self.is_dct_method():
+            self.combo_level['values'] = DCT_LEVELS
+            self.combo_level.current(1) # Default to Medium (Quality 50)
+            self.rd_canvas.delete("all")
+        else:
+            self.combo_level['values'] = QUANT_LEVELS
+            self.combo_level.current(6) # Default to Medium (2 bits)
+        if self.lossy_key is not None:
+            self.perform_lossy_compression()
+
+    def make_stats_panel(self, parent, stats=None):
+        return tk.Label(parent, text=stats.summary() if stats else "", font=("Consolas", 8),
+                        justify="left", anchor="w", bg="#fafafa")
+
+    def on_level_selected(self, event=None):
+        if self.lossy_key is not None:
+            self.perform_lossy_compression()
+
+    def draw_rd_curve(self, selected_bits):
+        canvas = self.rd_canvas
+        canvas.delete("all")
+        canvas.update_idletasks()
+        width, height = max(canvas.winfo_width(), 200), int(canvas["height"])
+        pad_x, pad_y = 40, 15
+
+        points = sorted(self.rd_sweep.items())
+        max_size = max(entry["estimated_size"] for _, entry in points) or 1
+        max_mse = max(entry["mse"] for _, entry in points) or 1
+
+        def to_xy(entry):
+            x = pad_x + (width - 2 * pad_x) * entry["estimated_size"] / max_size
+            y = height - pad_y - (height - 2 * pad_y) * entry["mse"] / max_mse
+            return x, y
+
+        coords = [c for _, entry in points for c in to_xy(entry)]
+        canvas.create_line(*coords, fill="#1976d2", width=2)
+        for bits, entry in points:
+            x, y = to_xy(entry)
+            color = "#d32f2f" if bits == selected_bits else "#1976d2"
+            canvas.create_oval(x - 3, y - 3, x + 3, y + 3, fill=color, outline=color)
+            canvas.create_text(x, y - 9, text=f"{bits}b", font=("Arial", 7), fill=color)
+        canvas.create_text(5, 5, text="MSE", anchor="nw", font=("Arial", 7), fill="gray")
+        canvas.create_text(width - 5, height - 3, text="Est. size", anchor="se", font=("Arial", 7), fill="gray")
 
     def save_lossy(self):
         if self.compressed_image:
-            f = filedialog.asksaveasfilename(defaultextension=".png", filetypes=[("PNG Image", "*.png"), ("JPEG Image", "*.jpg")])
+            stream = self.compressed_image.info.get("dct_stream")
+            filetypes = [("PNG Image", "*.png"), ("JPEG Image", "*.jpg")]
+            if stream is not None:
+                filetypes.insert(0, ("DCT Stream", "*.dct"))
+            f = filedialog.asksaveasfilename(defaultextension=".dct" if stream is not None else ".png", filetypes=filetypes)
             if f:
-                self.compressed_image.save(f)
+                if stream is not None and f.lower().endswith(".dct"):
+                    with open(f, "wb") as out:
+                        out.write(stream) # The coded stream the CR was measured on
+                else:
+                    self.compressed_image.save(f)
+                # The real encode happens here, so report the exact CR now
+                saved_size = os.path.getsize(f)
+                if saved_size > 0 and self.image_path and os.path.exists(self.image_path):
+                    cr = os.path.getsize(self.image_path) / saved_size
+                    self.lbl_stats.config(text=f"MSE: {self.lossy_mse:.4f}  |  CR: {cr:.2f} (saved file)")
                 messagebox.showinfo("Success", f"Saved to {os.path.basename(f)}")
 
 if __name__ == "__main__":
@@ -0,0 +1,363 @@
+"""Appendable block container for files that only grow (logs).
+
+Layout (UTF-8 headers, binary-safe bodies):
+
+    BLOCKS::::1\n
+    <codec>$$$<end>$$$<sha256>$$$<size>$$$<crc>$$$<chain>\n<package, size bytes>\n   (per block)
+
+end is the source byte offset the block stops at and sha256 the digest of
+the source bytes [0, end). crc is the CRC32 of the stored package and
+chain a running CRC32 over every block's (end, crc) so far, so verify()
+catches a damaged, missing or reordered block without decoding anything
+(containers written before the checksums have no crc / chain).
+
+A later run hashes the recorded prefix of the grown file; if it still
+matches, only the bytes after it are compressed, as new blocks appended
+behind the old ones (which are never rewritten).
+
+With algo "auto" every block carries the codec that coded it smallest.
+Blocks are independent, so they encode and decode in parallel.
+"""
+import codecs
+import hashlib
+import os
+import re
+import zlib
+from lossless_algorithms import LosslessLogic
+from instrumentation import NULL_STATS
+
+MAGIC = b"BLOCKS::::1\n"
+AUTO = "auto"
+DEFAULT_BLOCK_CHARS = 1 << 20
+MIN_REGION_CHARS = 256 # Shortest numeric / repeated-character run given its own block
+READ_BYTES = 1 << 20
+# Golomb NUM input ("12 7 30"; it decodes to single spaces) and runs of one character
+REGION_PATTERN = re.compile(r"(?<!\d)\d+(?: \d+)+|(.)\1{%d,}" % (MIN_REGION_CHARS - 1), re.S)
+
+
+class Block:
+    """Index entry of one block; offset / size locate its package in the container."""
+    __slots__ = ("codec", "end", "digest", "offset", "size", "crc", "chain")
+
+    def __init__(self, codec, end, digest, offset, size, crc=None, chain=None):
+        self.codec = codec
+        self.end = end
+        self.digest = digest
+        self.offset = offset
+        self.size = size
+        self.crc = crc
+        self.chain = chain
+
+    @staticmethod
+    def chain_crc(end, crc, previous_chain):
+        return zlib.crc32(f"{end}:{crc:08x}".encode("ascii"), previous_chain)
+
+
+class BlockContainer:
+
+    # ===================== Reading =====================
+    @staticmethod
+    def read_index(container_path):
+        """
+        Headers of every complete block, packages skipped.
+        Returns (blocks, valid_end): a record cut short by an interrupted
+        run is left out, and valid_end is where the complete ones stop.
+        """
+        blocks, valid_end, problem = BlockContainer._scan(container_path)
+        if problem:
+            raise ValueError(f"{problem} in {container_path}")
+        return blocks, valid_end
+
+    @staticmethod
+    def _scan(container_path):
+        """read_index that stops at the first bad record: (blocks, valid_end, problem or None)."""
+        blocks = []
+        with open(container_path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{container_path} is not a block container")
+            file_size = os.fstat(f.fileno()).st_size
+            valid_end = f.tell()
+            while True:
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    fields = line[:-1].decode("utf-8").split(LosslessLogic.SUB_SEPARATOR)
+                    if len(fields) == 4:
+                        fields += [None, None]
+                    codec, end, digest, size, crc, chain = fields
+                    block = Block(codec, int(end), digest, f.tell(), int(size),
+                                  crc and int(crc, 16), chain and int(chain, 16))
+                except ValueError:
+                    return blocks, valid_end, f"Corrupt header of block {len(blocks)} at byte {valid_end}"
+                if block.offset + block.size + 1 > file_size:
+                    break
+                f.seek(block.size, os.SEEK_CUR)
+                if f.read(1) != b"\n":
+                    return blocks, valid_end, f"Corrupt block {len(blocks)} at byte {valid_end}"
+                blocks.append(block)
+                valid_end = f.tell()
+        return blocks, valid_end, None
+
+    @staticmethod
+    def read_package(f, block):
+        f.seek(block.offset)
+        return f.read(block.size).decode("utf-8")
+
+    @staticmethod
+    def decompress_stream(container_path, workers=None):
+        """
+        Yields the decoded text block by block, in order. Blocks are decoded
+        by a process pool (default: one worker per CPU), a few per worker
+        at a time so only those packages are held. Every package is checked
+        against its CRC before decoding and every decoded block against the
+        recorded SHA-256; a mismatch raises ValueError naming the block.
+        """
+        blocks, _ = BlockContainer.read_index(container_path)
+        workers = max(1, min(len(blocks), workers or os.cpu_count() or 1))
+        hasher = hashlib.sha256()
+        pool = None
+        if workers > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            pool = ProcessPoolExecutor(max_workers=workers)
+        try:
+            with open(container_path, "rb") as f:
+                group = workers * 2
+                for i in range(0, len(blocks), group):
+                    jobs = []
+                    for index, block in enumerate(blocks[i:i + group], i):
+                        f.seek(block.offset)
+                        data = f.read(block.size)
+                        if block.crc is not None and zlib.crc32(data) != block.crc:
+                            raise ValueError(f"Block {index}: {BlockContainer.describe(blocks, index)} fails its CRC")
+                        jobs.append((block.codec, data.decode("utf-8")))
+                    texts = pool.map(_decode_block_job, jobs) if pool else map(_decode_block_job, jobs)
+                    for index, text in enumerate(texts, i):
+                        hasher.update(text.encode("utf-8"))
+                        if hasher.hexdigest() != blocks[index].digest:
+                            raise ValueError(f"Block {index}: {BlockContainer.describe(blocks, index)} "
+                                             f"does not decode to the recorded text")
+                        yield text
+        finally:
+            if pool:
+                pool.shutdown(cancel_futures=True)
+
+    @staticmethod
+    def describe(blocks, index):
+        start = blocks[index - 1].end if index else 0
+        return f"{blocks[index].codec}, source bytes {start}-{blocks[index].end}"
+
+    # ===================== Verification =====================
+    @staticmethod
+    def verify(container_path, workers=None):
+        """
+        Checks every block's package against its CRC, in parallel (zlib
+        releases the GIL, so threads suffice), and the chain of (end, crc)
+        over the whole stream, without decoding. Returns (blocks, problems):
+        problems lists (block index or None, message), empty when the
+        container is intact. Blocks written before the checksums (crc None)
+        are skipped.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        blocks, valid_end, problem = BlockContainer._scan(container_path)
+        problems = []
+
+        # 1. Stream: chain and offsets (headers only)
+        chain = 0
+        previous_end = 0
+        for index, block in enumerate(blocks):
+            if block.crc is None:
+                chain = 0  # Blocks appended after these start a new chain
+                previous_end = block.end
+                continue
+            if block.end < previous_end:
+                problems.append((index, f"{BlockContainer.describe(blocks, index)}: ends before the previous block"))
+            if Block.chain_crc(block.end, block.crc, chain) != block.chain:
+                problems.append((index, f"{BlockContainer.describe(blocks, index)}: "
+                                        f"stream chain broken (header damaged, or blocks missing / reordered)"))
+            chain = block.chain
+            previous_end = block.end
+        if problem:
+            problems.append((len(blocks), problem + "; the blocks after it cannot be read"))
+        elif valid_end < os.path.getsize(container_path):
+            problems.append((None, f"Partial record after byte {valid_end} (interrupted append)"))
+
+        # 2. Blocks: package CRCs, in parallel
+        checked = [(index, block) for index, block in enumerate(blocks) if block.crc is not None]
+        workers = max(1, min(len(checked), workers or os.cpu_count() or 1))
+        spans = [checked[i::workers] for i in range(workers)]
+        with ThreadPoolExecutor(max_workers=len(spans)) as pool:
+            for bad in pool.map(lambda span: BlockContainer._check_crcs(container_path, span), spans):
+                problems.extend((index, f"{BlockContainer.describe(blocks, index)}: CRC mismatch") for index in bad)
+        problems.sort(key=lambda p: (p[0] is None, p[0] or 0))
+        return blocks, problems
+
+    @staticmethod
+    def _check_crcs(container_path, span):
+        """Indexes of the (index, block) pairs whose package fails its CRC."""
+        bad = []
+        with open(container_path, "rb") as f:
+            for index, block in span:
+                f.seek(block.offset)
+                if zlib.crc32(f.read(block.size)) != block.crc:
+                    bad.append(index)
+        return bad
+
+    @staticmethod
+    def decompress_to_file(container_path, output_path, workers=None):
+        """Returns the number of characters written; a damaged block removes the partial output."""
+        written = 0
+        try:
+            with open(output_path, "w", encoding="utf-8", newline="") as out:
+                for text in BlockContainer.decompress_stream(container_path, workers):
+                    out.write(text)
+                    written += len(text)
+        except ValueError:
+            os.remove(output_path)
+            raise
+        return written
+
+    # ===================== Codec Choice =====================
+    @staticmethod
+    def split_regions(text):
+        """
+        Cuts text where its kind changes: numeric runs and runs of one
+        character of MIN_REGION_CHARS or more become pieces of their own
+        (the codecs that suit them only see them alone); the text between
+        them is one piece.
+        """
+        pieces = []
+        start = 0
+        for match in REGION_PATTERN.finditer(text):
+            if match.end() - match.start() < MIN_REGION_CHARS:
+                continue
+            if match.start() > start:
+                pieces.append(text[start:match.start()])
+            pieces.append(match.group())
+            start = match.end()
+        if start < len(text):
+            pieces.append(text[start:])
+        return pieces
+
+    @staticmethod
+    def encode_block(text, algo=AUTO):
+        """
+        -> (codec, package text). "auto" encodes the block with every codec
+        and keeps the smallest (theoretical size) that decodes back to the
+        block exactly, so a lossy fit (Golomb NUM respacing numbers, RLE
+        on '|') is never chosen.
+        """
+        if algo != AUTO:
+            return algo, LosslessLogic.compress(algo, text)
+        candidates = []
+        for codec in LosslessLogic.ALGORITHMS:
+            try:
+                package = LosslessLogic.encode(codec, text)
+            except Exception:
+                continue # e.g. LZW outside latin-1
+            candidates.append((package.theoretical_size(), codec, package))
+        candidates.sort(key=lambda candidate: candidate[0])
+        for _, codec, package in candidates:
+            if LosslessLogic.decompress(codec, package) == text:
+                return codec, package.serialize()
+        raise ValueError("No codec reproduces this block")
+
+    # ===================== Appending =====================
+    @staticmethod
+    def append_file(source_path, container_path, algo="LZW", block_chars=DEFAULT_BLOCK_CHARS, stats=None,
+                    workers=None):
+        """
+        Brings container_path up to date with source_path, compressing only
+        what was added since the last run. A source whose recorded prefix no
+        longer matches (rotated / rewritten) is compressed again from byte 0.
+        A trailing partial UTF-8 character waits for the next run.
+        algo "auto" also cuts blocks at split_regions and picks each block's
+        codec (encode_block), over a process pool of 'workers'.
+        Returns (blocks added, source bytes compressed, rebuilt).
+        """
+        if stats is None: stats = NULL_STATS
+        hasher = hashlib.sha256()
+
+        # 1. Last recorded prefix, checked against the source
+        blocks, valid_end = [], len(MAGIC)
+        if os.path.exists(container_path):
+            blocks, valid_end = BlockContainer.read_index(container_path)
+        start = 0
+        with open(source_path, "rb") as src:
+            if blocks:
+                last = blocks[-1]
+                with stats.stage("verify prefix", bytes_in=last.end):
+                    remaining = last.end
+                    while remaining > 0:
+                        data = src.read(min(READ_BYTES, remaining))
+                        if not data:
+                            break
+                        hasher.update(data)
+                        remaining -= len(data)
+                    if remaining == 0 and hasher.hexdigest() == last.digest:
+                        start = last.end
+                    else:
+                        hasher = hashlib.sha256()
+                        src.seek(0)
+            rebuilt = bool(blocks) and start == 0
+
+            # 2. Compress the tail block by block
+            records = []
+            end = start
+            chain = blocks[-1].chain if blocks and not rebuilt and blocks[-1].chain is not None else 0
+            pool = None
+            workers = workers or os.cpu_count() or 1
+            if algo == AUTO and workers > 1:
+                from concurrent.futures import ProcessPoolExecutor
+                pool = ProcessPoolExecutor(max_workers=workers)
+            with stats.stage(f"compress tail ({algo})") as st:
+                decoder = codecs.getincrementaldecoder("utf-8")()
+                pending = ""
+                while True:
+                    data = src.read(READ_BYTES)
+                    pending += decoder.decode(data, final=False)
+                    texts = []
+                    while len(pending) >= block_chars or (not data and pending):
+                        text, pending = pending[:block_chars], pending[block_chars:]
+                        texts.extend(BlockContainer.split_regions(text) if algo == AUTO else [text])
+                    jobs = [(text, algo) for text in texts]
+                    encoded = pool.map(_encode_block_job, jobs) if pool else map(_encode_block_job, jobs)
+                    for text, (codec, package) in zip(texts, encoded):
+                        raw = text.encode("utf-8")
+                        hasher.update(raw)
+                        end += len(raw)
+                        package = package.encode("utf-8")
+                        crc = zlib.crc32(package)
+                        chain = Block.chain_crc(end, crc, chain)
+                        header = LosslessLogic.SUB_SEPARATOR.join(
+                            (codec, str(end), hasher.hexdigest(), str(len(package)), f"{crc:08x}", f"{chain:08x}"))
+                        records.append(header.encode("utf-8") + b"\n" + package + b"\n")
+                        st.symbols += len(text)
+                        st.bytes_out += len(package)
+                    if not data:
+                        break
+                st.bytes_in = end - start
+            if pool:
+                pool.shutdown()
+
+        # 3. Append (after cutting off an interrupted record), or start over
+        if rebuilt or not blocks:
+            with open(container_path, "wb") as f:
+                f.write(MAGIC)
+                f.writelines(records)
+        elif records:
+            with open(container_path, "r+b") as f:
+                f.truncate(valid_end)
+                f.seek(valid_end)
+                f.writelines(records)
+        return len(records), end - start, rebuilt
+
+
+def _encode_block_job(job):
+    # Module-level so the process pool can pickle it
+    return BlockContainer.encode_block(*job)
+
+
+def _decode_block_job(job):
+    codec, package = job
+    return LosslessLogic.decompress(codec, package)
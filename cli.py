@@ -0,0 +1,502 @@
+"""Command-line entry point for the compression logic (no GUI needed)."""
+import argparse
+import os
+import sys
+import time
+
+# Import-time budget of the lossless-only path (module + its imports)
+LOSSLESS_IMPORT_BUDGET_MS = 50.0
+HEAVY_MODULES = ("numpy", "PIL")
+
+
+# ===================== Lossless =====================
+def cmd_compress(args):
+    from lossless_algorithms import LosslessLogic
+
+    with open(args.input, "r", encoding="utf-8", newline="") as f:
+        text = f.read()
+    dictionary = LosslessLogic.load_dictionary(args.dictionary) if args.dictionary else None
+    options = {}
+    if args.algo == "LZ77":
+        options = {"level": args.level, "window_bits": args.window_bits, "entropy": args.entropy}
+    try:
+        package, stats = LosslessLogic.compress_with_stats(
+            args.algo, text, profile=args.profile, trace_memory=args.trace_memory, dictionary=dictionary, **options)
+    except ValueError as e:
+        print(f"{args.algo}: {e}", file=sys.stderr)
+        return 1
+
+    output = args.output or f"{args.input}.{args.algo.lower()}.txt"
+    with open(output, "w", encoding="utf-8", newline="") as f:
+        f.write(package.serialize() if package else "")
+
+    original_size_bytes = len(text.encode("utf-8"))
+    theoretical_size = LosslessLogic.calculate_theoretical_size(package)
+    cr = package.compression_ratio(original_size_bytes) if package else 0.0
+    print(f"{args.algo}: {original_size_bytes} B -> {theoretical_size} B (theoretical)  CR: {cr:.2f}  -> {output}")
+    print_stats(args, stats)
+    return 0
+
+
+def cmd_decompress(args):
+    from lossless_algorithms import LosslessLogic
+
+    with open(args.input, "r", encoding="utf-8", newline="") as f:
+        package = f.read()
+    if args.dictionary:
+        LosslessLogic.load_dictionary(args.dictionary)
+    algo = args.algo or LosslessLogic.detect_algorithm(package)
+    if algo is None:
+        print(f"Could not detect the algorithm of {args.input}; pass --algo", file=sys.stderr)
+        return 1
+
+    if args.in_memory:
+        text, stats = LosslessLogic.decompress_with_stats(
+            algo, package, profile=args.profile, trace_memory=args.trace_memory)
+        with open(args.output, "w", encoding="utf-8", newline="") as f:
+            f.write(text)
+        length = len(text)
+    else:
+        # Streamed: the decoded text goes to disk piece by piece
+        from instrumentation import CompressionStats
+        stats = CompressionStats(f"{algo} decompress", profile=args.profile, trace_memory=args.trace_memory)
+        try:
+            with stats.session():
+                length, _ = LosslessLogic.decompress_to_file(algo, package, args.output, preview_chars=0, stats=stats)
+        except ValueError as e:
+            print(f"{algo}: {e}", file=sys.stderr)
+            return 1
+    print(f"{algo}: decoded {length} characters -> {args.output}")
+    print_stats(args, stats)
+    return 0
+
+
+def cmd_compare(args):
+    from lossless_algorithms import LosslessLogic
+
+    with open(args.input, "r", encoding="utf-8", newline="") as f:
+        text = f.read()
+    start = time.perf_counter()
+    rows = LosslessLogic.compare_codecs(text, args.algos, workers=args.workers, with_stats=args.stats)
+    elapsed = time.perf_counter() - start
+    print(LosslessLogic.comparison_table(rows, len(text.encode("utf-8"))))
+    print(f"Wall time: {elapsed * 1000:.1f} ms")
+    for row in rows:
+        if row["stats"] is not None:
+            print()
+            print(row["stats"].summary())
+        if args.output_dir and row["package"] is not None:
+            os.makedirs(args.output_dir, exist_ok=True)
+            with open(os.path.join(args.output_dir, f"{row['algo']}_compressed.txt"), "w", encoding="utf-8",
+                      newline="") as f:
+                f.write(row["package"].serialize())
+    return 0
+
+
+def cmd_train(args):
+    from lossless_algorithms import LosslessLogic
+
+    corpus = []
+    for path in args.corpus:
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            corpus.append(f.read())
+    dictionary = LosslessLogic.train_dictionary("".join(corpus), args.id, lzw_entries=args.lzw_entries)
+    LosslessLogic.save_dictionary(dictionary, args.output)
+    trained = LosslessLogic.get_dictionary(dictionary)
+    print(f"Dictionary '{dictionary}': static Huffman table (256 symbols), "
+          f"{len(trained['lzw_codes']) - 256} primed LZW phrases -> {args.output}")
+    return 0
+
+
+# ===================== Block Container =====================
+def cmd_append(args):
+    from collections import Counter
+    from block_container import BlockContainer
+    from instrumentation import CompressionStats
+
+    stats = CompressionStats(f"{args.algo} append", profile=args.profile, trace_memory=args.trace_memory)
+    with stats.session():
+        added, compressed, rebuilt = BlockContainer.append_file(
+            args.input, args.container, args.algo, block_chars=args.block_chars, stats=stats, workers=args.workers)
+    if rebuilt:
+        print(f"{args.input} no longer starts with the recorded prefix; container rebuilt")
+    print(f"{args.algo}: {compressed} new bytes in {added} block(s) -> {args.container}")
+    if args.algo == "auto" and added:
+        blocks, _ = BlockContainer.read_index(args.container)
+        tally = Counter(block.codec for block in blocks[-added:])
+        print("New blocks by codec: " + ", ".join(f"{codec} {count}" for codec, count in tally.most_common()))
+    print_stats(args, stats)
+    return 0
+
+
+def cmd_extract(args):
+    from block_container import BlockContainer
+
+    try:
+        length = BlockContainer.decompress_to_file(args.container, args.output, workers=args.workers)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(f"Decoded {length} characters -> {args.output}")
+    return 0
+
+
+def cmd_verify(args):
+    from block_container import BlockContainer
+
+    blocks, problems = BlockContainer.verify(args.container, workers=args.workers)
+    for index, message in problems:
+        print(f"Block {index}: {message}" if index is not None else message, file=sys.stderr)
+    if problems:
+        return 1
+    unchecked = sum(block.crc is None for block in blocks)
+    print(f"OK: {len(blocks)} block(s) in {args.container}"
+          + (f" ({unchecked} written before checksums, not checked)" if unchecked else ""))
+    return 0
+
+
+# ===================== Lossy =====================
+def cmd_quantize(args):
+    from PIL import Image
+    from lossy_algorithms import LossyLogic
+
+    image = Image.open(args.input)
+    if args.target_mse is not None or args.target_bytes is not None:
+        return quantize_to_target(args, image)
+    level = args.quality if args.method == "dct" else args.bits
+    extra = {} if args.method == "dct" else {"size_estimate": args.size_estimate}
+    compressed_image, mse, cr, stats = LossyLogic.run_with_stats(
+        args.method, image, level, args.input,
+        profile=args.profile, trace_memory=args.trace_memory, **extra)
+
+    if args.method == "dct" and args.output.lower().endswith(".dct"):
+        with open(args.output, "wb") as f:
+            f.write(compressed_image.info["dct_stream"])
+    else:
+        compressed_image.save(args.output)
+    cr_label = "CR (coded stream)" if args.method == "dct" else "CR"
+    print(f"MSE: {mse:.4f}  |  {cr_label}: {cr:.2f}  -> {args.output}")
+    print_stats(args, stats)
+    return 0
+
+
+def quantize_to_target(args, image):
+    from instrumentation import CompressionStats
+    from lossy_algorithms import LossyLogic
+
+    if args.method == "dct" or (args.target_mse is not None and args.target_bytes is not None):
+        print("Give one of --target-mse / --target-bytes, with --method quant", file=sys.stderr)
+        return 1
+    stats = CompressionStats("rate control", profile=args.profile, trace_memory=args.trace_memory)
+    with stats.session():
+        compressed_image, mse, cr, choice = LossyLogic.rate_control(
+            image, args.input, target_mse=args.target_mse, target_bytes=args.target_bytes,
+            size_estimate="entropy" if args.size_estimate == "entropy" else "zlib", stats=stats)
+
+    compressed_image.save(args.output)
+    print(f"{choice['bits']} bits: MSE: {mse:.4f}  |  CR: {cr:.2f}  |  {choice['size']} bytes  -> {args.output}")
+    if not choice["met"]:
+        print("Target not reached; used the closest bit depth", file=sys.stderr)
+    print_stats(args, stats)
+    return 0
+
+
+def cmd_dct_decode(args):
+    from lossy_algorithms import LossyLogic
+
+    with open(args.input, "rb") as f:
+        data = f.read()
+    try:
+        image = LossyLogic.dct_decompress(data)
+    except ValueError as e:
+        print(f"{args.input}: {e}", file=sys.stderr)
+        return 1
+    image.save(args.output)
+    print(f"Decoded {image.size[0]}x{image.size[1]} from {len(data)} B -> {args.output}")
+    return 0
+
+
+def print_stats(args, stats):
+    if args.stats or args.profile or args.trace_memory:
+        print()
+        print(stats.summary())
+    if stats.profile_report:
+        print()
+        print(stats.profile_report)
+
+
+# ===================== Batch Quantization =====================
+def cmd_batch(args):
+    from lossy_algorithms import LossyLogic
+
+    start = time.perf_counter()
+    table, results = LossyLogic.batch_quantize_directory(
+        args.input_dir,
+        args.output_dir,
+        args.bits,
+        workers=args.workers,
+        refine_iterations=args.refine,
+        sample_images=args.sample_images,
+    )
+    elapsed = time.perf_counter() - start
+
+    if not results:
+        print(f"No images found in {args.input_dir}")
+        return 1
+
+    for image_path, output_path, mse, cr in results:
+        print(f"{os.path.basename(image_path)} -> {os.path.basename(output_path)}  MSE: {mse:.4f}  CR: {cr:.2f}")
+    centroids = [centroid for _, centroid in sorted(table.values())]
+    print(f"Shared table ({len(centroids)} levels): {centroids}")
+    print(f"{len(results)} images in {elapsed:.2f}s ({len(results) / elapsed:.1f} images/s)")
+    return 0
+
+
+def cmd_sequence(args):
+    from PIL import Image
+    from lossy_algorithms import LossyLogic, SequenceQuantizer
+
+    frames = LossyLogic.list_images(args.input_dir)
+    if not frames:
+        print(f"No images found in {args.input_dir}")
+        return 1
+    os.makedirs(args.output_dir, exist_ok=True)
+    quantizer = SequenceQuantizer(args.bits, reuse_drift=args.reuse_drift, retrain_drift=args.retrain_drift,
+                                  refine_iterations=args.refine)
+
+    start = time.perf_counter()
+    for path, name in zip(frames, LossyLogic.output_names(frames)):
+        with Image.open(path) as img:
+            compressed_image, mse, cr, action = quantizer.quantize(img, path, size_estimate=args.size_estimate)
+        compressed_image.save(os.path.join(args.output_dir, name), format="PNG")
+        print(f"{os.path.basename(path)} -> {name}  MSE: {mse:.4f}  CR: {cr:.2f}  table: {action}")
+    elapsed = time.perf_counter() - start
+
+    counts = quantizer.counts
+    print(f"{len(frames)} frames in {elapsed:.2f}s ({len(frames) / elapsed:.1f} frames/s): "
+          f"{counts['reused']} reused, {counts['refined']} refined, {counts['trained']} trained")
+    return 0
+
+
+# ===================== Service =====================
+def cmd_serve(args):
+    import asyncio
+    from compression_service import CompressionService, DEFAULT_ADDRESS
+
+    service = CompressionService(workers=args.workers, queue_size=args.queue_size,
+                                 batch_size=args.batch_size, batch_window_ms=args.batch_window_ms)
+    try:
+        asyncio.run(service.serve(args.address or DEFAULT_ADDRESS))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def cmd_loadtest(args):
+    import asyncio
+    from compression_service import load_test, DEFAULT_ADDRESS
+
+    with open(args.input, "r", encoding="utf-8", newline="") as f:
+        text = f.read()
+    result = asyncio.run(load_test(args.address or DEFAULT_ADDRESS, text, algo=args.algo, requests=args.requests,
+                                   connections=args.connections, pipeline=args.pipeline))
+    latency = result["latency_ms"]
+    print(f"{result['requests']} x {args.algo} ({len(text)} chars) in {result['seconds']:.2f}s: "
+          f"{result['requests_per_s']:.0f} req/s, {result['errors']} errors")
+    print(f"Client latency ms  p50 {latency['p50']:.2f}  p95 {latency['p95']:.2f}  "
+          f"p99 {latency['p99']:.2f}  max {latency['max']:.2f}")
+    server = result["server"]
+    if server:
+        print(f"Server: {server['batches']} batches (mean size {server['mean_batch_size']:.1f}), "
+              f"queue {server['queue_depth']}/{server['queue_size']}, "
+              f"latency p50 {server['latency_ms']['p50']:.2f} ms")
+    return 1 if result["errors"] else 0
+
+
+# ===================== Startup Budget =====================
+def measure_lossless_startup(runs=5):
+    """
+    Imports lossless_algorithms in fresh interpreters and returns
+    (best import time in ms, heavy modules it pulled in).
+    """
+    import json
+    import subprocess
+    probe = (
+        "import json, sys, time\n"
+        "t = time.perf_counter()\n"
+        "import lossless_algorithms\n"
+        "ms = (time.perf_counter() - t) * 1000\n"
+        f"print(json.dumps([ms, [m for m in {HEAVY_MODULES!r} if m in sys.modules]]))\n"
+    )
+    here = os.path.dirname(os.path.abspath(__file__))
+    best_ms, heavy = float("inf"), []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", probe], cwd=here,
+                             capture_output=True, text=True, check=True).stdout
+        ms, heavy = json.loads(out)
+        best_ms = min(best_ms, ms)
+    return best_ms, heavy
+
+
+def cmd_startup_check(args):
+    best_ms, heavy = measure_lossless_startup(args.runs)
+    print(f"lossless_algorithms import: {best_ms:.1f} ms (budget {args.budget_ms:.1f} ms)")
+    if heavy:
+        print(f"FAIL: lossless path imported {', '.join(heavy)}")
+        return 1
+    if best_ms > args.budget_ms:
+        print("FAIL: over budget")
+        return 1
+    print("OK")
+    return 0
+
+
+# ===================== Parser =====================
+def build_parser():
+    parser = argparse.ArgumentParser(description="Data Compression Project (command line)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    # Instrumentation flags shared by the single-file commands
+    stats_flags = argparse.ArgumentParser(add_help=False)
+    stats_flags.add_argument("--stats", action="store_true", help="Print per-stage time / bytes / symbol counts")
+    stats_flags.add_argument("--profile", action="store_true", help="Also run cProfile and print the top functions")
+    stats_flags.add_argument("--trace-memory", action="store_true", help="Also report peak memory (tracemalloc)")
+
+    algos = ("RLE", "Huffman", "Golomb", "LZW", "LZ77")
+
+    p_comp = sub.add_parser("compress", parents=[stats_flags], help="Compress a text file")
+    p_comp.add_argument("algo", choices=algos)
+    p_comp.add_argument("input")
+    p_comp.add_argument("-o", "--output", help="Output file (default: <input>.<algo>.txt)")
+    p_comp.add_argument("--dictionary", help="Trained dictionary file (Huffman / LZW); the package refers to it by ID")
+    p_comp.add_argument("--level", choices=("fast", "normal", "thorough"), default="normal",
+                        help="LZ77 match search effort (default: normal)")
+    p_comp.add_argument("--window-bits", type=int, default=15, help="LZ77 window of 2**N characters (default: 15)")
+    p_comp.add_argument("--entropy", choices=("huffman", "raw"), default="huffman",
+                        help="LZ77 coding of literals / lengths (default: huffman)")
+    p_comp.set_defaults(func=cmd_compress)
+
+    p_decomp = sub.add_parser("decompress", parents=[stats_flags], help="Decompress a compressed text file")
+    p_decomp.add_argument("input")
+    p_decomp.add_argument("-o", "--output", required=True)
+    p_decomp.add_argument("--algo", choices=algos, help="Algorithm (default: read from the package header)")
+    p_decomp.add_argument("--dictionary", help="Trained dictionary file the package refers to")
+    p_decomp.add_argument("--in-memory", action="store_true",
+                          help="Decode the whole text first, then write it (per-stage stats; default: stream)")
+    p_decomp.set_defaults(func=cmd_decompress)
+
+    p_compare = sub.add_parser("compare", help="Run several codecs at once on a text file and rank them")
+    p_compare.add_argument("input")
+    p_compare.add_argument("--algos", nargs="+", choices=algos, default=list(algos))
+    p_compare.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    p_compare.add_argument("--stats", action="store_true", help="Also print every codec's stage stats")
+    p_compare.add_argument("-o", "--output-dir", help="Also write <codec>_compressed.txt files here")
+    p_compare.set_defaults(func=cmd_compare)
+
+    p_train = sub.add_parser("train", help="Train a shared Huffman table + primed LZW dictionary")
+    p_train.add_argument("corpus", nargs="+", help="Sample text file(s)")
+    p_train.add_argument("-o", "--output", required=True, help="Dictionary file (JSON)")
+    p_train.add_argument("--id", help="Dictionary ID written into packages (default: hash of the corpus)")
+    p_train.add_argument("--lzw-entries", type=int, default=4096, help="Primed LZW phrases (default: 4096)")
+    p_train.set_defaults(func=cmd_train)
+
+    p_append = sub.add_parser("append", parents=[stats_flags],
+                              help="Compress what a growing file gained since the last run into a block container")
+    p_append.add_argument("algo", choices=algos + ("auto",), help="auto: the smallest codec per block")
+    p_append.add_argument("input")
+    p_append.add_argument("container")
+    p_append.add_argument("--block-chars", type=int, default=1 << 20,
+                          help="Characters per block (default: 1048576)")
+    p_append.add_argument("--workers", type=int, default=None, help="Processes trying codecs for auto (default: CPU count)")
+    p_append.set_defaults(func=cmd_append)
+
+    p_extract = sub.add_parser("extract", help="Decode a block container")
+    p_extract.add_argument("container")
+    p_extract.add_argument("-o", "--output", required=True)
+    p_extract.add_argument("--workers", type=int, default=None, help="Decoding processes (default: CPU count)")
+    p_extract.set_defaults(func=cmd_extract)
+
+    p_verify = sub.add_parser("verify", help="Check a block container's CRCs without decoding it")
+    p_verify.add_argument("container")
+    p_verify.add_argument("--workers", type=int, default=None, help="Checking threads (default: CPU count)")
+    p_verify.set_defaults(func=cmd_verify)
+
+    p_quant = sub.add_parser("quantize", parents=[stats_flags], help="Lossy-compress one image")
+    p_quant.add_argument("input")
+    p_quant.add_argument("output", help="Output image; with --method dct, a .dct name stores the coded stream")
+    p_quant.add_argument("--method", choices=("quant", "dct"), default="quant",
+                         help="Non-uniform quantization or 8x8 DCT transform coding (default: quant)")
+    p_quant.add_argument("--bits", type=int, default=3, help="Bit depth for quant (default: 3)")
+    p_quant.add_argument("--quality", type=int, default=50, help="Quality 1-100 for dct (default: 50)")
+    p_quant.add_argument("--size-estimate", choices=("png", "zlib", "entropy"), default="png",
+                         help="How quant measures the compressed size (default: exact png)")
+    p_quant.add_argument("--target-mse", type=float, default=None,
+                         help="Pick the fewest bits (and a refined table) that reach this MSE instead of --bits")
+    p_quant.add_argument("--target-bytes", type=int, default=None,
+                         help="Pick the lowest-MSE bit depth whose PNG fits in this many bytes instead of --bits")
+    p_quant.set_defaults(func=cmd_quantize)
+
+    p_dct = sub.add_parser("dct-decode", help="Decode a .dct stream written by quantize --method dct")
+    p_dct.add_argument("input")
+    p_dct.add_argument("output")
+    p_dct.set_defaults(func=cmd_dct_decode)
+
+    p_batch = sub.add_parser("batch", help="Quantize a directory of images with one shared table")
+    p_batch.add_argument("input_dir")
+    p_batch.add_argument("output_dir")
+    p_batch.add_argument("--bits", type=int, default=3, help="Bit depth of the shared table (default: 3)")
+    p_batch.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    p_batch.add_argument("--refine", type=int, default=0,
+                         help="Per-image Lloyd iterations warm-started from the shared table (default: 0)")
+    p_batch.add_argument("--sample-images", type=int, default=64,
+                         help="Images pooled to train the shared table (default: 64)")
+    p_batch.set_defaults(func=cmd_batch)
+
+    p_seq = sub.add_parser("sequence", help="Quantize ordered frames, reusing tables between similar frames")
+    p_seq.add_argument("input_dir", help="Frames, processed in file name order")
+    p_seq.add_argument("output_dir")
+    p_seq.add_argument("--bits", type=int, default=3, help="Bit depth (default: 3)")
+    p_seq.add_argument("--reuse-drift", type=float, default=0.02,
+                       help="Histogram drift below which the cached table is reused as is (default: 0.02)")
+    p_seq.add_argument("--retrain-drift", type=float, default=0.25,
+                       help="Drift from which the table is retrained from scratch (default: 0.25)")
+    p_seq.add_argument("--refine", type=int, default=3,
+                       help="Warm-started Lloyd iterations in between (default: 3)")
+    p_seq.add_argument("--size-estimate", choices=("png", "zlib", "entropy"), default="png",
+                       help="How the compressed size is measured (default: exact png)")
+    p_seq.set_defaults(func=cmd_sequence)
+
+    p_serve = sub.add_parser("serve", help="Run the local compression service")
+    p_serve.add_argument("--address", default=None,
+                         help="Unix socket path or host:port (default: /tmp/compression_service.sock)")
+    p_serve.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    p_serve.add_argument("--queue-size", type=int, default=256, help="Queued requests before backpressure")
+    p_serve.add_argument("--batch-size", type=int, default=32, help="Small requests per worker call")
+    p_serve.add_argument("--batch-window-ms", type=float, default=2.0,
+                         help="How long a small request waits for a batch to fill")
+    p_serve.set_defaults(func=cmd_serve)
+
+    p_load = sub.add_parser("loadtest", help="Load-test a running compression service")
+    p_load.add_argument("input", help="Text file sent as every request")
+    p_load.add_argument("--address", default=None, help="Same as for serve")
+    p_load.add_argument("--algo", choices=algos, default="LZW")
+    p_load.add_argument("--requests", type=int, default=1000)
+    p_load.add_argument("--connections", type=int, default=8)
+    p_load.add_argument("--pipeline", type=int, default=16, help="Outstanding requests per connection")
+    p_load.set_defaults(func=cmd_loadtest)
+
+    p_startup = sub.add_parser("startup-check", help="Check the lossless-only import path against its time budget")
+    p_startup.add_argument("--budget-ms", type=float, default=LOSSLESS_IMPORT_BUDGET_MS)
+    p_startup.add_argument("--runs", type=int, default=5, help="Fresh interpreters to try (best is kept)")
+    p_startup.set_defaults(func=cmd_startup_check)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
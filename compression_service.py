@@ -0,0 +1,337 @@
+"""Local asyncio compression service (one interpreter shared by many callers).
+
+Protocol: one JSON object per line over a Unix socket or localhost TCP,
+answered by one JSON line carrying the same "id" (answers of one
+connection may come back out of order):
+
+    {"id": 1, "op": "compress", "algo": "LZW", "text": "..."}
+    {"id": 2, "op": "decompress", "package": "LZW::::..."}         (algo optional)
+    {"id": 3, "op": "quantize", "path": "in.png", "bits": 3, "output": "out.png"}
+    {"id": 4, "op": "metrics"}
+
+    -> {"id": 1, "ok": true, "result": ...} / {"id": 1, "ok": false, "error": "..."}
+
+CPU work runs in a process pool. Small requests are batched into one pool
+call; a bounded queue applies backpressure (a full queue stops reading
+from the sockets).
+"""
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_ADDRESS = "/tmp/compression_service.sock"
+SMALL_REQUEST_BYTES = 16 * 1024  # below this, requests share a batch
+MAX_LINE_BYTES = 256 * 1024 * 1024
+STRING_FIELDS = ("op", "algo", "text", "package", "path", "output", "size_estimate")
+
+
+# ===================== Worker Side =====================
+def run_job(job):
+    """Runs one request (in a pool worker); returns its result."""
+    op = job["op"]
+    if op == "compress":
+        from lossless_algorithms import LosslessLogic
+        return LosslessLogic.compress(job["algo"], job["text"])
+    if op == "decompress":
+        from lossless_algorithms import LosslessLogic
+        package = job["package"]
+        algo = job.get("algo") or LosslessLogic.detect_algorithm(package)
+        if algo is None:
+            raise ValueError("Unknown package algorithm")
+        return LosslessLogic.decompress(algo, package)
+    if op == "quantize":
+        from PIL import Image
+        from lossy_algorithms import LossyLogic
+        image = Image.open(job["path"])
+        compressed_image, mse, cr = LossyLogic.run_quantization(
+            image, int(job.get("bits", 3)), job["path"], size_estimate=job.get("size_estimate", "png"))
+        if job.get("output"):
+            compressed_image.save(job["output"])
+        return {"mse": float(mse), "cr": float(cr)}
+    raise ValueError(f"Unknown op: {op}")
+
+
+def run_batch(jobs):
+    """One pool call for a whole batch: [(ok, result or error text), ...]."""
+    results = []
+    for job in jobs:
+        try:
+            results.append((True, run_job(job)))
+        except Exception as e:
+            results.append((False, f"{type(e).__name__}: {e}"))
+    return results
+
+
+# ===================== Server =====================
+class CompressionService:
+    def __init__(self, workers=None, queue_size=256, batch_size=32, batch_window_ms=2.0):
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.batch_window = batch_window_ms / 1000.0
+        self.pool = None
+        self.queue = None
+        self.slots = None
+        # Metrics
+        self.started = time.perf_counter()
+        self.requests = 0
+        self.errors = 0
+        self.batches = 0
+        self.batched_requests = 0
+        self.in_flight = 0
+        self.latencies = deque(maxlen=2048)  # seconds, most recent requests
+
+    async def serve(self, address=DEFAULT_ADDRESS):
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self.slots = asyncio.Semaphore(self.workers)  # batches in flight
+        batcher = asyncio.create_task(self.batch_loop())
+        host, port = parse_address(address)
+        if port is None:
+            if os.path.exists(host):
+                os.unlink(host)
+            server = await asyncio.start_unix_server(self.handle_connection, path=host, limit=MAX_LINE_BYTES)
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port, limit=MAX_LINE_BYTES)
+        print(f"Compression service on {address} ({self.workers} workers)")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            self.pool.shutdown(cancel_futures=True)
+            if port is None and os.path.exists(host):
+                os.unlink(host)
+
+    async def handle_connection(self, reader, writer):
+        write_lock = asyncio.Lock()
+        pending = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except json.JSONDecodeError as e:
+                    await self.respond(writer, write_lock, {"id": None, "ok": False, "error": f"Bad JSON: {e}"})
+                    continue
+                problem = request_problem(request)
+                if problem:
+                    request_id = request.get("id") if isinstance(request, dict) else None
+                    await self.respond(writer, write_lock, {"id": request_id, "ok": False, "error": problem})
+                    continue
+                if request.get("op") == "metrics":
+                    await self.respond(writer, write_lock, {"id": request.get("id"), "ok": True, "result": self.metrics()})
+                    continue
+                # Blocks (stops reading this socket) while the queue is full
+                future = asyncio.get_running_loop().create_future()
+                await self.queue.put((request, future, time.perf_counter()))
+                task = asyncio.create_task(self.answer(request, future, writer, write_lock))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            if pending:
+                await asyncio.gather(*pending)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            pass  # Server shutting down
+        finally:
+            writer.close()
+
+    async def answer(self, request, future, writer, write_lock):
+        ok, result = await future
+        reply = {"id": request.get("id"), "ok": ok}
+        reply["result" if ok else "error"] = result
+        await self.respond(writer, write_lock, reply)
+
+    @staticmethod
+    async def respond(writer, write_lock, reply):
+        async with write_lock:
+            writer.write(json.dumps(reply).encode("utf-8") + b"\n")
+            await writer.drain()
+
+    async def batch_loop(self):
+        """Groups queued requests into batches and hands them to the pool."""
+        loop = asyncio.get_running_loop()
+        running = set()
+        carry = None
+        while True:
+            batch = [carry or await self.queue.get()]
+            carry = None
+            try:
+                # Large requests run alone; small ones wait briefly for company
+                if request_size(batch[0][0]) < SMALL_REQUEST_BYTES:
+                    deadline = loop.time() + self.batch_window
+                    while len(batch) < self.batch_size:
+                        try:
+                            item = self.queue.get_nowait()
+                        except asyncio.QueueEmpty:
+                            timeout = deadline - loop.time()
+                            if timeout <= 0:
+                                break
+                            try:
+                                item = await asyncio.wait_for(self.queue.get(), timeout)
+                            except asyncio.TimeoutError:
+                                break
+                        batch.append(item)
+                        if request_size(item[0]) >= SMALL_REQUEST_BYTES:
+                            carry = batch.pop()  # Next round, as a batch of its own
+                            break
+                # No more than one batch per worker in flight: the queue fills up
+                await self.slots.acquire()
+                task = asyncio.create_task(self.run_batch(batch))
+                running.add(task)
+                task.add_done_callback(running.discard)
+            except Exception as e:
+                # Fail this batch, keep the batcher alive for everyone else
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_result((False, f"{type(e).__name__}: {e}"))
+
+    async def run_batch(self, batch):
+        self.in_flight += len(batch)
+        try:
+            jobs = [request for request, _, _ in batch]
+            try:
+                results = await asyncio.get_running_loop().run_in_executor(self.pool, run_batch, jobs)
+            except Exception as e:
+                results = [(False, f"{type(e).__name__}: {e}")] * len(batch)
+        finally:
+            self.in_flight -= len(batch)
+            self.slots.release()
+        self.batches += 1
+        self.batched_requests += len(batch)
+        now = time.perf_counter()
+        for (_, future, queued_at), (ok, result) in zip(batch, results):
+            self.requests += 1
+            self.errors += not ok
+            self.latencies.append(now - queued_at)
+            future.set_result((ok, result))
+
+    def metrics(self):
+        latencies = sorted(self.latencies)
+        uptime = time.perf_counter() - self.started
+        return {
+            "uptime_s": uptime,
+            "requests": self.requests,
+            "errors": self.errors,
+            "requests_per_s": self.requests / uptime if uptime > 0 else 0.0,
+            "queue_depth": self.queue.qsize() if self.queue else 0,
+            "queue_size": self.queue_size,
+            "in_flight": self.in_flight,
+            "batches": self.batches,
+            "mean_batch_size": self.batched_requests / self.batches if self.batches else 0.0,
+            "latency_ms": latency_percentiles(latencies),
+        }
+
+
+def parse_address(address):
+    """
+    '/path/to.sock' -> (path, None); 'host:port' -> (host, port).
+    TCP is local only: the quantize op reads and writes arbitrary paths.
+    """
+    if "/" in address or ":" not in address:
+        return address, None
+    host, port = address.rsplit(":", 1)
+    host = host.strip("[]") or "127.0.0.1"
+    if host != "localhost":
+        import ipaddress
+        try:
+            loopback = ipaddress.ip_address(host).is_loopback
+        except ValueError:
+            loopback = False
+        if not loopback:
+            raise ValueError(f"Refusing non-loopback host {host}: the service is local only")
+    return host, int(port)
+
+
+def request_problem(request):
+    """Error text for a request the workers cannot take, else None."""
+    if not isinstance(request, dict):
+        return "Request must be a JSON object"
+    for field in STRING_FIELDS:
+        if field in request and not isinstance(request[field], str):
+            return f"Field '{field}' must be a string"
+    return None
+
+
+def request_size(request):
+    body = request.get("text") or request.get("package") or ""
+    return len(body) if isinstance(body, str) else 0
+
+
+def latency_percentiles(sorted_seconds):
+    if not sorted_seconds:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    def pick(q):
+        return sorted_seconds[min(len(sorted_seconds) - 1, int(q * len(sorted_seconds)))] * 1000
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": sorted_seconds[-1] * 1000}
+
+
+# ===================== Client / Load Test =====================
+async def open_connection(address=DEFAULT_ADDRESS):
+    host, port = parse_address(address)
+    if port is None:
+        return await asyncio.open_unix_connection(host, limit=MAX_LINE_BYTES)
+    return await asyncio.open_connection(host, port, limit=MAX_LINE_BYTES)
+
+
+async def call(address, request):
+    """One request on a fresh connection; returns the reply dict."""
+    reader, writer = await open_connection(address)
+    try:
+        writer.write(json.dumps(dict(request, id=0)).encode("utf-8") + b"\n")
+        await writer.drain()
+        return json.loads(await reader.readline())
+    finally:
+        writer.close()
+
+
+async def load_test(address, text, algo="LZW", requests=1000, connections=8, pipeline=16):
+    """
+    Sends 'requests' compress calls over 'connections' sockets, each with up
+    to 'pipeline' requests outstanding. Returns client-side numbers plus the
+    server's metrics.
+    """
+    latencies = []
+    errors = 0
+    per_connection = [requests // connections + (i < requests % connections) for i in range(connections)]
+
+    async def worker(count):
+        reader, writer = await open_connection(address)
+        sent_at = {}
+        window = asyncio.Semaphore(pipeline)
+
+        async def read_replies():
+            nonlocal errors
+            for _ in range(count):
+                reply = json.loads(await reader.readline())
+                latencies.append(time.perf_counter() - sent_at.pop(reply["id"]))
+                errors += not reply["ok"]
+                window.release()
+
+        receiver = asyncio.create_task(read_replies())
+        for i in range(count):
+            await window.acquire()
+            sent_at[i] = time.perf_counter()
+            writer.write(json.dumps({"id": i, "op": "compress", "algo": algo, "text": text}).encode("utf-8") + b"\n")
+            await writer.drain()
+        await receiver
+        writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(count) for count in per_connection if count))
+    elapsed = time.perf_counter() - start
+    server = await call(address, {"op": "metrics"})
+    return {
+        "requests": requests,
+        "errors": errors,
+        "seconds": elapsed,
+        "requests_per_s": requests / elapsed if elapsed > 0 else 0.0,
+        "latency_ms": latency_percentiles(sorted(latencies)),
+        "server": server.get("result"),
+    }
@@ -0,0 +1,110 @@
+"""Per-stage timing / size instrumentation for the compression logic."""
+import time
+from contextlib import contextmanager
+
+
+class StageStats:
+    __slots__ = ("name", "seconds", "bytes_in", "bytes_out", "symbols")
+
+    def __init__(self, name, bytes_in=0, bytes_out=0, symbols=0):
+        self.name = name
+        self.seconds = 0.0
+        self.bytes_in = bytes_in
+        self.bytes_out = bytes_out
+        self.symbols = symbols
+
+    def as_dict(self):
+        return {s: getattr(self, s) for s in self.__slots__}
+
+
+class CompressionStats:
+    """
+    Collects one StageStats per stage of a run:
+
+        stats = CompressionStats()
+        with stats.stage("encode", bytes_in=len(data)) as st:
+            ...
+            st.bytes_out = len(out)
+
+    profile=True / trace_memory=True additionally run cProfile / tracemalloc
+    around session() and keep the report and the peak allocation.
+    """
+
+    def __init__(self, label="", profile=False, trace_memory=False):
+        self.label = label
+        self.stages = []
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.profile_report = ""
+        self.peak_memory_bytes = None
+
+    @contextmanager
+    def stage(self, name, bytes_in=0, symbols=0):
+        record = StageStats(name, bytes_in=bytes_in, symbols=symbols)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record.seconds = time.perf_counter() - start
+            self.stages.append(record)
+
+    @contextmanager
+    def session(self):
+        """Wraps a whole run with the optional profiler / memory tracer."""
+        profiler = None
+        if self.profile:
+            import cProfile
+            profiler = cProfile.Profile()
+        if self.trace_memory:
+            import tracemalloc
+            tracemalloc.start()
+        if profiler:
+            profiler.enable()
+        try:
+            yield self
+        finally:
+            if profiler:
+                profiler.disable()
+                import io
+                import pstats
+                out = io.StringIO()
+                pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(15)
+                self.profile_report = out.getvalue()
+            if self.trace_memory:
+                import tracemalloc
+                self.peak_memory_bytes = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+    @property
+    def total_seconds(self):
+        return sum(s.seconds for s in self.stages)
+
+    def as_dict(self):
+        return {
+            "label": self.label,
+            "total_seconds": self.total_seconds,
+            "stages": [s.as_dict() for s in self.stages],
+            "peak_memory_bytes": self.peak_memory_bytes,
+        }
+
+    def summary(self):
+        """Fixed-width table of the stages (for the GUI panel and CLI)."""
+        lines = [f"{'Stage':<24}{'Time (ms)':>11}{'In (B)':>12}{'Out (B)':>12}{'Symbols':>10}"]
+        for s in self.stages:
+            lines.append(f"{s.name:<24}{s.seconds * 1000:>11.2f}{s.bytes_in:>12}{s.bytes_out:>12}{s.symbols:>10}")
+        lines.append(f"{'Total':<24}{self.total_seconds * 1000:>11.2f}")
+        if self.peak_memory_bytes is not None:
+            lines.append(f"Peak traced memory: {self.peak_memory_bytes / 1024:.1f} KiB")
+        return "\n".join(lines)
+
+
+class _NullStats:
+    """Stand-in when no stats are requested: stages cost one no-op."""
+
+    @contextmanager
+    def stage(self, name, bytes_in=0, symbols=0):
+        yield _NULL_STAGE
+
+
+_NULL_STAGE = StageStats("")
+NULL_STATS = _NullStats()
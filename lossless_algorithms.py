@@ -1,9 +1,56 @@
-"""Simple Lossless Compression Algorithms with Embedded Metadata"""
+"""Simple Lossless Compression Algorithms with Embedded Metadata
+
+Kept light to import (no NumPy / PIL at module level): text-only tools
+load only this module, see cli.py startup-check.
+"""
 import math
 from collections import Counter
-import heapq
-import ast
-import re
+from instrumentation import NULL_STATS
+
+
+class CompressedPackage:
+    """
+    A codec's output as fields, filled in while encoding, so size and
+    ratio queries need no pass over the body; the "codec::::meta::::body"
+    text is only built for I/O (serialize / str). bit_length is the exact
+    coded size of the body, symbol_count the number of coded symbols
+    (runs, codes, values; None when parsed back from text).
+    """
+    __slots__ = ("codec", "meta", "body", "symbol_count", "bit_length")
+
+    def __init__(self, codec, meta, body, symbol_count, bit_length):
+        self.codec = codec
+        self.meta = meta
+        self.body = body
+        self.symbol_count = symbol_count
+        self.bit_length = bit_length
+
+    @staticmethod
+    def parse(text):
+        """Package from its text: one split, plus one pass to count RLE / LZW body bits."""
+        codec, meta, body = text.split(LosslessLogic.SEPARATOR, 2)
+        return CompressedPackage(codec, meta, body, None, LosslessLogic._body_bits(codec, meta, body))
+
+    def header(self):
+        return f"{self.codec}{LosslessLogic.SEPARATOR}{self.meta}{LosslessLogic.SEPARATOR}"
+
+    def serialize(self):
+        return self.header() + self.body
+
+    __str__ = serialize
+
+    def __len__(self):
+        """Length of the serialized text, without building it."""
+        return len(self.header()) + len(self.body)
+
+    def theoretical_size(self):
+        """Header bytes + the coded body in whole bytes."""
+        return len(self.header().encode("utf-8")) + math.ceil(self.bit_length / 8)
+
+    def compression_ratio(self, original_size_bytes):
+        size = self.theoretical_size()
+        return original_size_bytes / size if size > 0 else 0.0
+
 
 class LosslessLogic:
     
@@ -12,66 +59,212 @@ class LosslessLogic:
 
     # ===================== RLE (Unchanged) =====================
     @staticmethod
-    def rle_compress(text):
+    def rle_compress(text, stats=None):
         if not text: return ""
-        result = []
-        counts = [] 
-        count = 1
-        for i in range(1, len(text)):
-            if text[i] == text[i-1]:
-                count += 1
-            else:
-                result.append(f"{text[i-1]}{count}|")
-                counts.append(count)
-                count = 1
-        result.append(f"{text[-1]}{count}|")
-        counts.append(count)
-        encoded_body = "".join(result)
+        if stats is None: stats = NULL_STATS
+        with stats.stage("encode runs", bytes_in=len(text)) as st:
+            result = []
+            counts = [] 
+            count = 1
+            for i in range(1, len(text)):
+                if text[i] == text[i-1]:
+                    count += 1
+                else:
+                    result.append(f"{text[i-1]}{count}|")
+                    counts.append(count)
+                    count = 1
+            result.append(f"{text[-1]}{count}|")
+            counts.append(count)
+            encoded_body = "".join(result)
+            st.symbols = len(counts)
+            st.bytes_out = len(encoded_body)
         max_count = max(counts) if counts else 0
         count_bits = max_count.bit_length() 
         if count_bits == 0: count_bits = 1 
-        return f"RLE{LosslessLogic.SEPARATOR}{count_bits}{LosslessLogic.SEPARATOR}{encoded_body}"
+        return CompressedPackage("RLE", str(count_bits), encoded_body, len(counts), len(counts) * (8 + count_bits))
     
     @staticmethod
-    def rle_decompress(compressed_package):
+    def rle_decompress(compressed_package, stats=None):
+        if stats is None: stats = NULL_STATS
+        data = LosslessLogic._rle_body(compressed_package)
+        with stats.stage("decode runs", bytes_in=len(data)) as st:
+            text = "".join(LosslessLogic._rle_decode(data))
+            st.symbols = data.count("|")
+            st.bytes_out = len(text)
+        return text
+
+    @staticmethod
+    def rle_decompress_stream(compressed_package, chunk_chars=1 << 16):
+        return LosslessLogic._rle_decode(LosslessLogic._rle_body(compressed_package), chunk_chars)
+
+    @staticmethod
+    def _rle_body(compressed_package):
         try:
-            algo, meta, data = compressed_package.split(LosslessLogic.SEPARATOR, 2)
+            algo, meta, data = LosslessLogic._package_fields(compressed_package)
             if algo != "RLE": raise ValueError("Not RLE")
         except ValueError: data = compressed_package
-        result = []
-        pairs = data.split('|')
-        for pair in pairs:
-            if not pair: continue 
+        return data
+
+    @staticmethod
+    def _rle_decode(data, chunk_chars=1 << 16):
+        """Yields the runs in pieces of about chunk_chars characters (long runs are cut too)."""
+        result = []; size = 0
+        pos = 0; n = len(data)
+        while pos < n:
+            end = data.find("|", pos)
+            if end < 0: end = n
+            pair = data[pos:end]; pos = end + 1
+            if not pair: continue
             char = pair[0]
             count_str = pair[1:]
-            if count_str.isdigit():
-                result.append(char * int(count_str))
-        return "".join(result)
+            if not count_str.isdigit(): continue
+            count = int(count_str)
+            while count:
+                take = min(count, chunk_chars - size)
+                result.append(char * take)
+                size += take; count -= take
+                if size >= chunk_chars:
+                    yield "".join(result)
+                    result = []; size = 0
+        if result: yield "".join(result)
     
     # ===================== Huffman (Unchanged) =====================
     @staticmethod
-    def huffman_compress(text):
+    def huffman_compress(text, stats=None, dictionary=None):
+        """dictionary: ID of a trained dictionary whose static table is used (not embedded)."""
         if not text: return None, ""
-        freq = Counter(text)
-        heap = [[weight, [char, ""]] for char, weight in freq.items()]
-        heapq.heapify(heap)
-        while len(heap) > 1:
-            smallest = heapq.heappop(heap)
-            secsmallest = heapq.heappop(heap)
-            for pair in smallest[1:]: pair[1] = "0" + pair[1]
-            for pair in secsmallest[1:]: pair[1] = "1" + pair[1]
-            heapq.heappush(heap, [smallest[0] + secsmallest[0]] + smallest[1:] + secsmallest[1:])
-        codes = dict(heap[0][1:]) if heap[0][1:] else {text[0]: "0"}
-        encoded_body = "".join(codes[ch] for ch in text)
-        return f"Huffman{LosslessLogic.SEPARATOR}{codes}{LosslessLogic.SEPARATOR}{encoded_body}"
+        if stats is None: stats = NULL_STATS
+        import numpy as np
+        if dictionary is not None and max(text) <= "\xff":
+            trained = LosslessLogic.get_dictionary(dictionary)
+            with stats.stage("encode (static table)", bytes_in=len(text), symbols=len(text)) as st:
+                code_rows, in_code = trained["huffman_rows"]
+                code_points = np.frombuffer(text.encode("latin-1"), dtype=np.uint8)
+                encoded_body = LosslessLogic._huffman_pack(code_points, code_rows, in_code)
+                st.bytes_out = (len(encoded_body) + 7) // 8
+            return CompressedPackage("Huffman", f"@{dictionary}", encoded_body, len(text), len(encoded_body))
+        with stats.stage("frequency count", bytes_in=len(text)) as st:
+            code_points = np.frombuffer(text.encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+            counts = np.bincount(code_points)
+            symbols = np.flatnonzero(counts)
+            st.symbols = len(symbols)
+        with stats.stage("tree build", symbols=len(symbols)):
+            lengths = LosslessLogic._huffman_code_lengths(counts[symbols].tolist())
+            codes = LosslessLogic._canonical_codes([chr(s) for s in symbols.tolist()], lengths)
+        with stats.stage("encode", bytes_in=len(text), symbols=len(text)) as st:
+            # Symbol -> row of its code as '0'/'1' bytes (padded) + its length
+            symbol_index = np.zeros(len(counts), dtype=np.int32)
+            symbol_index[symbols] = np.arange(len(symbols), dtype=np.int32)
+            code_rows, in_code = LosslessLogic._huffman_rows([codes[chr(s)] for s in symbols.tolist()])
+            encoded_body = LosslessLogic._huffman_pack(symbol_index[code_points], code_rows, in_code)
+            st.bytes_out = (len(encoded_body) + 7) // 8
+        return CompressedPackage("Huffman", str(codes), encoded_body, len(text), len(encoded_body))
+
+    @staticmethod
+    def _huffman_code_lengths(weights):
+        """
+        Code length per symbol from a two-queue Huffman build (O(n) after
+        sorting the leaves): merged nodes come out in non-decreasing weight
+        order, so the smallest two are always at the queue fronts. Only
+        parent links are kept; depths are read off from the root down.
+        """
+        count = len(weights)
+        if count == 1: return [1]
+        order = sorted(range(count), key=weights.__getitem__)
+        weight = [weights[i] for i in order] # leaves 0..count-1 ascending, then internal nodes
+        parent = [0] * (2 * count - 1)
+        leaf = 0; merged = count
+        for node in range(count, 2 * count - 1):
+            total = 0
+            for _ in range(2):
+                # Take the lighter queue front (leaves win ties)
+                if leaf < count and (merged >= node or weight[leaf] <= weight[merged]):
+                    child = leaf; leaf += 1
+                else:
+                    child = merged; merged += 1
+                parent[child] = node
+                total += weight[child]
+            weight.append(total)
+        depth = [0] * (2 * count - 1)
+        for node in range(2 * count - 3, -1, -1):
+            depth[node] = depth[parent[node]] + 1
+        lengths = [0] * count
+        for position, symbol in enumerate(order):
+            lengths[symbol] = depth[position]
+        return lengths
+
+    @staticmethod
+    def _canonical_codes(symbols, lengths):
+        """Canonical Huffman codes {symbol: '0101'} from code lengths."""
+        codes = {}
+        code = 0; previous_length = 0
+        for length, symbol in sorted(zip(lengths, symbols)):
+            code <<= length - previous_length
+            codes[symbol] = format(code, f"0{length}b")
+            code += 1
+            previous_length = length
+        return codes
+
+    @staticmethod
+    def _huffman_rows(code_strings):
+        """Codes as padded rows of '0'/'1' bytes + the mask of bits inside each code."""
+        import numpy as np
+        width = max(len(code) for code in code_strings)
+        code_rows = np.zeros((len(code_strings), width), dtype=np.uint8)
+        for row, code in zip(code_rows, code_strings):
+            row[:len(code)] = np.frombuffer(code.encode("ascii"), dtype=np.uint8)
+        in_code = np.arange(width) < np.array([len(code) for code in code_strings])[:, None]
+        return code_rows, in_code
+
+    @staticmethod
+    def _huffman_pack(indices, code_rows, in_code, chunk=1 << 20):
+        """
+        Bulk encode: np.take of every symbol's code row, keep the bits inside
+        its length, emit as one '0'/'1' string (chunked to bound memory).
+        """
+        import numpy as np
+        parts = []
+        for start in range(0, len(indices), chunk):
+            idx = indices[start:start + chunk]
+            parts.append(np.take(code_rows, idx, axis=0)[np.take(in_code, idx, axis=0)])
+        return np.concatenate(parts).tobytes().decode("ascii")
     
     @staticmethod
-    def huffman_decompress(compressed_package, _ignored=None):
-        try:
-            algo, meta, encoded_body = compressed_package.split(LosslessLogic.SEPARATOR, 2)
-            codes = ast.literal_eval(meta)
-        except Exception: return "Error parsing Huffman"
+    def huffman_decompress(compressed_package, _ignored=None, stats=None):
+        if stats is None: stats = NULL_STATS
+        with stats.stage("parse header", bytes_in=len(compressed_package)):
+            try: codes, encoded_body = LosslessLogic._huffman_header(compressed_package)
+            except ValueError as e: return str(e)
         if not codes or not encoded_body: return ""
+        with stats.stage("decode", bytes_in=(len(encoded_body) + 7) // 8) as st:
+            text = "".join(LosslessLogic._huffman_decode(codes, encoded_body))
+            st.symbols = len(text)
+            st.bytes_out = len(text)
+        return text
+
+    @staticmethod
+    def huffman_decompress_stream(compressed_package, chunk_chars=1 << 16):
+        codes, encoded_body = LosslessLogic._huffman_header(compressed_package)
+        if not codes or not encoded_body: return iter(())
+        return LosslessLogic._huffman_decode(codes, encoded_body, chunk_chars)
+
+    @staticmethod
+    def _huffman_header(compressed_package):
+        """-> (codes, encoded body); ValueError carrying the error text."""
+        try:
+            import ast # Only the Huffman header needs it
+            algo, meta, encoded_body = LosslessLogic._package_fields(compressed_package)
+            if meta.startswith("@"):
+                codes = LosslessLogic.get_dictionary(meta[1:])["huffman_codes"]
+            else:
+                codes = ast.literal_eval(meta)
+        except KeyError: raise ValueError(f"Error: unknown dictionary {meta[1:]}")
+        except Exception: raise ValueError("Error parsing Huffman")
+        return codes, encoded_body
+
+    @staticmethod
+    def _huffman_decode(codes, encoded_body, chunk_chars=1 << 16):
+        """Yields the decoded symbols in pieces of chunk_chars."""
         reverse_codes = {v: k for k, v in codes.items()}
         result = []
         current = ""
@@ -80,222 +273,1172 @@ class LosslessLogic:
             if current in reverse_codes:
                 result.append(reverse_codes[current])
                 current = ""
-        return "".join(result)
+                if len(result) == chunk_chars:
+                    yield "".join(result)
+                    result = []
+        if result: yield "".join(result)
     
     # ===================== Golomb Coding (SIMPLIFIED) =====================
     @staticmethod
-    def golomb_compress(text):
+    def golomb_compress(text, stats=None, transform="auto"):
         """
         Compress using Golomb.
         - Mode "NUM": Input "11 12" -> Encodes ints [11, 12]
         - Mode "TXT": Input "A" -> Encodes int [65] (Raw ASCII)
+        NUM needs every token to fit int64 (else TXT). transform: "none",
+        "delta" or "delta2" (delta of delta, both zigzagged to unsigned)
+        before coding, or "auto" for the one with the fewest bits; the
+        leading value(s) a delta starts from go to the metadata.
         """
         if not text: return {}, 0, ""
+        if stats is None: stats = NULL_STATS
+        import numpy as np
         
         # 1. Detect Mode
-        tokens = text.split()
-        if tokens and all(t.isdigit() for t in tokens):
-            mode = "NUM"
-            values = [int(t) for t in tokens]
-        else:
-            mode = "TXT"
-            # STRICT ASCII MAPPING: No shift, just raw ord()
-            values = [ord(c) for c in text]
-
-        # 2. Helper: Encoding Logic
-        def get_golomb_code(n, m):
-            q = n // m
-            r = n % m
-            
-            # Unary Quotient
-            quotient_code = "1" * q + "0"
-            
-            # Truncated Binary Remainder
-            b = math.ceil(math.log2(m))
-            T = 2**b - m
-            if r < T:
-                remainder_code = format(r, f'0{b-1}b')
+        with stats.stage("parse", bytes_in=len(text)) as st:
+            numbers = LosslessLogic._parse_int_tokens(text)
+            if numbers is not None and len(numbers):
+                mode = "NUM"
             else:
-                remainder_code = format(r + T, f'0{b}b')
-            
-            return quotient_code + remainder_code
+                mode = "TXT"
+                # STRICT ASCII MAPPING: No shift, just raw code points
+                code_points = np.frombuffer(text.encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+            st.symbols = len(numbers) if mode == "NUM" else len(code_points)
+
+        # 2. Transform + Search for Optimal M (per transform for NUM)
+        with stats.stage("M search") as st:
+            if mode == "NUM":
+                names = ("none", "delta", "delta2") if transform == "auto" else (transform,)
+                options = []
+                for name in names:
+                    # Too short for the delta: keep the values as they are
+                    if len(numbers) <= LosslessLogic.GOLOMB_TRANSFORMS.index(name): name = "none"
+                    values, seeds = LosslessLogic._golomb_transform(numbers, name)
+                    options.append(LosslessLogic._golomb_best_m(values) + (values, name, seeds))
+                min_total_bits, m, values, transform, seeds = min(options, key=lambda option: option[:2])
+            else:
+                values = code_points.astype(np.int64)
+                min_total_bits, m = LosslessLogic._golomb_best_m(values)
+                transform, seeds = "none", []
+            st.symbols = len(values)
+        
+        # 3. Final Compression
+        with stats.stage("encode", symbols=len(values)) as st:
+            encoded_body = LosslessLogic._golomb_encode(values, m)
+            st.bytes_out = (len(encoded_body) + 7) // 8
+        
+        metadata = f"{m}{LosslessLogic.SUB_SEPARATOR}{mode}"
+        if transform != "none":
+            metadata += f"{LosslessLogic.SUB_SEPARATOR}{transform}{LosslessLogic.SUB_SEPARATOR}{','.join(map(str, seeds))}"
+        
+        return CompressedPackage("Golomb", metadata, encoded_body, len(values), len(encoded_body))
 
-        # 3. Grid Search for Optimal M
+    # Powers of ten that fit int64 (NUM tokens have at most 18 digits)
+    _MAX_NUM_DIGITS = 18
+
+    @staticmethod
+    def _parse_int_tokens(text):
+        """
+        Whitespace-separated non-negative integers -> int64 array, parsed in
+        bulk from the ASCII bytes; None if a token is not all digits or too
+        long for int64.
+        """
+        import numpy as np
+        if not text.isascii(): return None
+        data = np.frombuffer(text.encode("ascii"), dtype=np.uint8)
+        digit = data - np.uint8(ord("0")) # wraps non-digits above 9
+        is_digit = digit <= 9
+        # str.split() whitespace: \t \n \v \f \r, \x1c-\x1f and space
+        is_space = ((data >= 9) & (data <= 13)) | ((data >= 28) & (data <= 32))
+        if not (is_digit | is_space).all(): return None
+        if not is_digit.any(): return np.zeros(0, dtype=np.int64)
+
+        edges = np.diff(is_digit.view(np.int8), prepend=np.int8(0), append=np.int8(0))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+        width = int((ends - starts).max())
+        if width > LosslessLogic._MAX_NUM_DIGITS: return None
+
+        # Horner over digit places, all tokens at once (right-aligned)
+        values = np.zeros(len(starts), dtype=np.int64)
+        for place in range(width, 0, -1):
+            pos = ends - place
+            values = values * 10 + np.where(pos >= starts, digit[np.maximum(pos, 0)], 0)
+        return values
+
+    @staticmethod
+    def _format_ints(values):
+        """Non-negative int64 array -> "v0 v1 ..." built in one byte buffer."""
+        import numpy as np
+        values = np.asarray(values, dtype=np.int64)
+        if not len(values): return ""
+        powers = 10 ** np.arange(1, 19, dtype=np.int64)
+        digits = np.searchsorted(powers, values, side="right") + 1
+        ends = np.cumsum(digits + 1) - 1 # index of the separator after each value
+        out = np.full(int(ends[-1]), ord(" "), dtype=np.uint8)
+        remaining = values.copy()
+        for place in range(int(digits.max())):
+            live = digits > place
+            out[(ends - 1 - place)[live]] = (remaining[live] % 10 + ord("0")).astype(np.uint8)
+            remaining //= 10
+        return out.tobytes().decode("ascii")
+
+    # NUM transforms; the index is how many leading values each keeps aside
+    GOLOMB_TRANSFORMS = ("none", "delta", "delta2")
+
+    @staticmethod
+    def _golomb_transform(values, transform):
+        """
+        -> (values to code, seeds). none: as is; delta / delta2: first /
+        second differences zigzagged to unsigned, the first value (and first
+        difference) they start from being the seeds.
+        """
+        if transform not in LosslessLogic.GOLOMB_TRANSFORMS: raise ValueError(f"Unknown transform: {transform}")
+        seeds = []
+        for _ in range(LosslessLogic.GOLOMB_TRANSFORMS.index(transform)):
+            seeds.append(int(values[0]))
+            values = values[1:] - values[:-1]
+        # Zigzag: 0, -1, 1, -2, 2 ... -> 0, 1, 2, 3, 4 ...
+        if seeds: values = (values << 1) ^ (values >> 63)
+        return values, seeds
+
+    @staticmethod
+    def _golomb_untransform(values, transform, seeds):
+        import numpy as np
+        if transform == "none": return values
+        values = (values >> 1) ^ -(values & 1)
+        for seed in reversed(seeds):
+            values = np.cumsum(np.concatenate(([seed], values)))
+        return values
+
+    @staticmethod
+    def _golomb_untransform_chunks(chunks, transform, seeds):
+        """_golomb_untransform over consecutive chunks (each running sum carries over)."""
+        import numpy as np
+        carries = None
+        for values in chunks:
+            if transform != "none":
+                values = (values >> 1) ^ -(values & 1)
+                if carries is None:
+                    carries = []
+                    for seed in reversed(seeds):
+                        values = np.cumsum(np.concatenate(([seed], values)))
+                        carries.append(values[-1])
+                else:
+                    for level, carry in enumerate(carries):
+                        values = carry + np.cumsum(values)
+                        carries[level] = values[-1]
+            yield values
+
+    @staticmethod
+    def _golomb_code_lengths(values, m):
+        """Golomb code length (bits) of every value for one M."""
+        import numpy as np
+        b = math.ceil(math.log2(m))
+        T = 2**b - m
+        q, r = np.divmod(values, m)
+        # Encoder writes a single '0' remainder bit when b == 0
+        rem_len = np.where(r < T, b - 1, b) if m > 1 else 1
+        return q + 1 + rem_len
+
+    @staticmethod
+    def _golomb_best_m(values):
+        """(total bits, M) of the cheapest M, over the unique values at once."""
+        import numpy as np
+        unique, counts = np.unique(values, return_counts=True)
         # Heuristic to limit search space for large numbers
-        mean_val = sum(values) / len(values) if values else 1
+        mean_val = float(np.dot(unique.astype(float), counts)) / len(values) if len(values) else 1
         heuristic_m = math.ceil(0.69 * mean_val)
-        
         candidates = list(range(1, 257))
         if heuristic_m > 256:
             candidates.append(int(heuristic_m))
-            
-        freq = Counter(values)
-        best_m = 1
-        min_total_bits = float('inf')
+
+        # Best first guess first; skip any M whose lower bound on the total
+        # (quotients >= v/m - (m-1)/m, remainders >= b - 1 bits) cannot win.
+        # Ties still go to the earlier candidate, as in a plain scan.
+        total_value = float(np.dot(unique.astype(float), counts))
+        count = len(values)
+        best = None # (total bits, position in candidates, M)
+        for position in [len(candidates) - 1] + list(range(len(candidates) - 1)):
+            candidate_m = candidates[position]
+            b = math.ceil(math.log2(candidate_m))
+            lower_bound = total_value / candidate_m - count * (candidate_m - 1) / candidate_m + count * max(b, 1)
+            if best is not None and lower_bound > best[0]: continue
+            total_bits = float(np.dot(LosslessLogic._golomb_code_lengths(unique, candidate_m).astype(float), counts))
+            if best is None or (total_bits, position) < best[:2]:
+                best = (total_bits, position, candidate_m)
+        return best[0], best[2]
+
+    @staticmethod
+    def _golomb_encode(values, m, chunk=1 << 20):
+        """
+        Bulk Golomb encode to a '0'/'1' string: each codeword is q ones, a
+        zero, then its truncated-binary remainder; written by position into
+        one byte buffer per chunk of values.
+        """
+        import numpy as np
+        b = math.ceil(math.log2(m))
+        T = 2**b - m
+        parts = []
+        for start in range(0, len(values), chunk):
+            q, r = np.divmod(values[start:start + chunk], m)
+            if m > 1:
+                is_short = r < T
+                rem_len = np.where(is_short, b - 1, b)
+                rem_val = np.where(is_short, r, r + T)
+            else:
+                rem_len = np.ones(len(q), dtype=np.int64)
+                rem_val = np.zeros(len(q), dtype=np.int64)
+            lengths = q + 1 + rem_len
+            ends = np.cumsum(lengths)
+            zero_at = ends - rem_len - 1
+            out = np.full(int(ends[-1]), ord("1"), dtype=np.uint8)
+            out[zero_at] = ord("0")
+            for k in range(int(rem_len.max())):
+                live = rem_len > k
+                bit = (rem_val[live] >> (rem_len[live] - 1 - k)) & 1
+                out[zero_at[live] + 1 + k] = (bit + ord("0")).astype(np.uint8)
+            parts.append(out)
+        return np.concatenate(parts).tobytes().decode("ascii")
+    
+    @staticmethod
+    def golomb_decompress(compressed_package, _ignored_m=None, _ignored_map=None, stats=None):
+        try: m, mode, transform, seeds, encoded_body = LosslessLogic._golomb_header(compressed_package)
+        except ValueError: return "Error"
+
+        if not encoded_body or m == 0: return ""
+        if stats is None: stats = NULL_STATS
         
-        for candidate_m in candidates:
-            if candidate_m == 0: continue
-            current_total_bits = 0
-            for val, count in freq.items():
-                code_len = len(get_golomb_code(val, candidate_m))
-                current_total_bits += count * code_len
-            
-            if current_total_bits < min_total_bits:
-                min_total_bits = current_total_bits
-                best_m = candidate_m
+        # Only '0'/'1' characters form a valid body
+        if encoded_body.count("0") + encoded_body.count("1") != len(encoded_body): return "Error"
         
-        # 4. Final Compression
-        m = best_m
-        encoded_list = []
-        for val in values:
-            encoded_list.append(get_golomb_code(val, m))
+        with stats.stage("decode", bytes_in=(len(encoded_body) + 7) // 8) as st:
+            import numpy as np
+            bits = np.frombuffer(encoded_body.encode("ascii"), dtype=np.uint8) - ord("0")
+            decoded_values = LosslessLogic._golomb_decode_bits(bits, m)
+            st.symbols = len(decoded_values)
             
-        encoded_body = "".join(encoded_list)
-        
-        metadata = f"{m}{LosslessLogic.SUB_SEPARATOR}{mode}"
-        
-        return f"Golomb{LosslessLogic.SEPARATOR}{metadata}{LosslessLogic.SEPARATOR}{encoded_body}"
-    
+        # 4. Reconstruct Text
+        with stats.stage("format output", symbols=len(decoded_values)) as st:
+            decoded_values = LosslessLogic._golomb_untransform(decoded_values, transform, seeds)
+            text = LosslessLogic._golomb_format(decoded_values, mode)
+            st.bytes_out = len(text)
+        return text
+
     @staticmethod
-    def golomb_decompress(compressed_package, _ignored_m=None, _ignored_map=None):
+    def golomb_decompress_stream(compressed_package, chunk_chars=1 << 16):
+        """
+        Decodes about 8 * chunk_chars bits at a time (a NUM chunk can thus
+        come out longer than chunk_chars); delta sums carry across chunks.
+        """
+        try: m, mode, transform, seeds, encoded_body = LosslessLogic._golomb_header(compressed_package)
+        except ValueError: raise ValueError("Error")
+        if not encoded_body or m == 0: return
+        if encoded_body.count("0") + encoded_body.count("1") != len(encoded_body): raise ValueError("Error")
+        import numpy as np
+        bits = np.frombuffer(bytearray(encoded_body, "ascii"), dtype=np.uint8)
+        bits -= ord("0") # In place: one byte per bit in total
+        chunks = LosslessLogic._golomb_decode_chunks(bits, m, chunk_bits=max(1024, 8 * chunk_chars))
+        separator = ""
+        for values in LosslessLogic._golomb_untransform_chunks(chunks, transform, seeds):
+            text = LosslessLogic._golomb_format(values, mode)
+            if text.startswith("Error"): raise ValueError(text)
+            # NUM chunks are joined by the space between their numbers
+            yield separator + text
+            if mode == "NUM": separator = " "
+
+    @staticmethod
+    def _golomb_header(compressed_package):
+        """-> (m, mode, transform, seeds, encoded body); ValueError if malformed."""
         try:
-            algo, meta, encoded_body = compressed_package.split(LosslessLogic.SEPARATOR, 2)
-            if algo != "Golomb": return "Error"
+            algo, meta, encoded_body = LosslessLogic._package_fields(compressed_package)
+            if algo != "Golomb": raise ValueError
             
+            # m$$$mode[$$$transform$$$seeds]
+            transform, seeds = "none", []
             if LosslessLogic.SUB_SEPARATOR in meta:
-                m_str, mode = meta.split(LosslessLogic.SUB_SEPARATOR)
-                m = int(m_str)
+                fields = meta.split(LosslessLogic.SUB_SEPARATOR)
+                m, mode = int(fields[0]), fields[1]
+                if len(fields) > 3:
+                    transform, seeds = fields[2], [int(s) for s in fields[3].split(",")]
+                    if transform not in LosslessLogic.GOLOMB_TRANSFORMS[1:] or \
+                            len(seeds) != LosslessLogic.GOLOMB_TRANSFORMS.index(transform): raise ValueError
             else:
                 m = int(meta)
                 mode = "TXT"
-                
-        except Exception: return "Error"
+        except Exception: raise ValueError("Error")
+        return m, mode, transform, seeds, encoded_body
 
-        if not encoded_body or m == 0: return ""
-        
-        decoded_values = []
-        i = 0
-        n_len = len(encoded_body)
-        
+    @staticmethod
+    def _golomb_format(decoded_values, mode):
+        if mode == "NUM":
+            # Reconstruct list of numbers
+            if len(decoded_values) and decoded_values.min() < 0: return "Error"
+            return LosslessLogic._format_ints(decoded_values)
+        # TXT Mode: code points -> text in one decode call
+        try:
+            import numpy as np
+            if len(decoded_values) and (decoded_values.min() < 0 or decoded_values.max() > 0x10FFFF):
+                raise ValueError
+            return decoded_values.astype(np.uint32).tobytes().decode("utf-32-le")
+        except (ValueError, UnicodeDecodeError):
+            return "Error: Decoded invalid ASCII"
+
+    @staticmethod
+    def _golomb_decode_bits(bits, m, chunk_bits=1 << 20):
+        """Golomb decoder over a 0/1 uint8 array -> int64 values."""
+        import numpy as np
+        decoded = list(LosslessLogic._golomb_decode_chunks(bits, m, chunk_bits))
+        return np.concatenate(decoded) if decoded else np.zeros(0, dtype=np.int64)
+
+    @staticmethod
+    def _golomb_decode_chunks(bits, m, chunk_bits=1 << 20):
+        """
+        Yields the int64 values of every chunk of about chunk_bits bits.
+
+        Per chunk, NumPy finds the unary terminators (flatnonzero of the
+        zeros) and, for each of them, the truncated-binary remainder that
+        follows and hence the terminator of the next codeword. Python then
+        only hops terminator -> terminator (one list lookup per codeword);
+        quotients and remainders are gathered in batch. Chunks begin on a
+        codeword boundary, so no state is carried over.
+        """
+        import numpy as np
         b = math.ceil(math.log2(m))
         T = 2**b - m
+        short = max(b - 1, 0)
+        n = len(bits)
+        start = 0
+        while start < n:
+            stop = min(n, start + chunk_bits)
+
+            # Extend the window until the codeword running over 'stop' fits
+            extra = 64 + b
+            while True:
+                end = min(n, stop + extra)
+                tail = bits[stop:max(stop, end - b - 1)]
+                if end == n or (len(tail) and tail.min() == 0):
+                    break
+                extra *= 2
+
+            # Window + zero padding (a final truncated codeword reads zeros)
+            window = np.concatenate((bits[start:end], np.zeros(b + 2, dtype=np.uint8)))
+            is_zero = window == 0
+            zeros = np.flatnonzero(is_zero)
+            # Index of the next terminator at or after every position
+            rank = np.cumsum(is_zero, dtype=np.int32) - is_zero
+
+            # Remainder after every terminator a codeword can end on
+            p = zeros[zeros <= end - start] + 1
+            short_val = np.zeros(len(p), dtype=np.int64)
+            for k in range(short):
+                short_val = (short_val << 1) | window[p + k]
+            if m == 1:
+                # Encoder writes a single '0' remainder bit when b == 0
+                is_short = np.ones(len(p), dtype=bool)
+                rem_len = 1
+            else:
+                is_short = short_val < T
+                rem_len = np.where(is_short, short, short + 1)
+            ends = p + rem_len
+
+            # Terminator of the next codeword; -1 once past this chunk
+            local_stop = stop - start
+            hop = np.where(ends < local_stop, rank[np.minimum(ends, local_stop)], -1)
+            chosen = LosslessLogic._golomb_chain(hop)
+
+            z = zeros[chosen]
+            starts = np.concatenate(([0], ends[chosen[:-1]]))
+            if m == 1:
+                r = np.zeros(len(chosen), dtype=np.int64)
+            else:
+                long_val = (short_val[chosen] << 1) | window[p[chosen] + short]
+                r = np.where(is_short[chosen], short_val[chosen], long_val - T)
+            yield (z - starts) * m + r
+            start += int(ends[chosen[-1]])
+
+    @staticmethod
+    def _golomb_chain(hop, segment=1024):
+        """
+        Terminators on the chain 0 -> hop[0] -> ... (until -1), increasing.
+
+        The terminators are cut into segments and one walker per segment
+        follows hop from the segment start in lockstep (one NumPy step for
+        all walkers). A walker that started mid-codeword soon lands on the
+        true chain (Golomb codes resynchronize), so the true chain is spliced
+        together segment by segment: short Python walks from the true entry
+        until they meet the segment's walker, then the walker's path.
+        """
+        import numpy as np
+        count = len(hop)
+        walkers = max(1, count // segment)
+        bounds = np.linspace(0, count, walkers + 1).astype(np.int64)
+        seg_end = bounds[1:]
+
+        # 1. Lockstep walk of every segment (paths padded with 'count')
+        cur = bounds[:-1].copy()
+        active = np.ones(walkers, dtype=bool)
+        exit_node = np.full(walkers, -1, dtype=np.int64)
+        rows = []
+        while True:
+            rows.append(np.where(active, cur, count))
+            nxt = hop[cur]
+            leaving = active & ((nxt < 0) | (nxt >= seg_end))
+            exit_node[leaving] = nxt[leaving]
+            active &= ~leaving
+            if not active.any():
+                break
+            cur = np.where(active, nxt, cur)
+        paths = np.array(rows).T
+        on_path = np.zeros(count + 1, dtype=bool)
+        on_path[paths] = True
+
+        # 2. Splice: walk from the true entry until it meets the walker
+        pieces = []
+        node = 0
+        for i in range(walkers):
+            if node < 0:
+                break
+            if node >= seg_end[i]:
+                continue
+            fix = []
+            while 0 <= node < seg_end[i] and not on_path[node]:
+                fix.append(node)
+                node = int(hop[node])
+            pieces.append(np.array(fix, dtype=np.int64))
+            if 0 <= node < seg_end[i]:
+                path = paths[i]
+                pieces.append(path[np.searchsorted(path, node):np.searchsorted(path, count)])
+                node = int(exit_node[i])
+        return np.concatenate(pieces)
 
-        while i < n_len:
-            # 1. Quotient
-            q = 0
-            while i < n_len and encoded_body[i] == "1":
-                q += 1
-                i += 1
-            if i < n_len and encoded_body[i] == "0":
-                i += 1
-            
-            # 2. Remainder
-            r = 0
-            len_short = b - 1
-            if i + len_short <= n_len:
-                temp_val = int(encoded_body[i:i+len_short], 2)
-                i += len_short
-                if temp_val < T:
-                    r = temp_val
-                else:
-                    if i < n_len:
-                        next_bit = int(encoded_body[i])
-                        i += 1
-                        val = (temp_val << 1) + next_bit
-                        r = val - T
-            
-            # 3. Recover Value
-            num = q * m + r
-            decoded_values.append(num)
-            
-        # 4. Reconstruct Text
-        if mode == "NUM":
-            # Reconstruct list of numbers
-            return " ".join(str(v) for v in decoded_values)
-        else:
-            # TXT Mode: Simple ASCII conversion
-            try:
-                chars = [chr(v) for v in decoded_values]
-                return "".join(chars)
-            except:
-                return "Error: Decoded invalid ASCII"
-    
     # ===================== LZW (Unchanged) =====================
     @staticmethod
-    def lzw_compress(text):
+    def lzw_compress(text, stats=None, dictionary=None):
+        """dictionary: ID of a trained dictionary whose primed phrases are used (not embedded)."""
         if not text: return ""
-        dictionary = {chr(i): i for i in range(256)}
-        next_code = 256; current = ""; result = []
-        for next_char in text:
-            combined = current + next_char
-            if combined in dictionary: current = combined
-            else:
-                result.append(str(dictionary[current]))
-                dictionary[combined] = next_code
-                next_code += 1
-                current = next_char
-        if current: result.append(str(dictionary[current]))
-        max_code = next_code
-        bit_width = max_code.bit_length()
-        if bit_width < 8: bit_width = 8
-        encoded_body = "|".join(result)
-        return f"LZW{LosslessLogic.SEPARATOR}{bit_width}{LosslessLogic.SEPARATOR}{encoded_body}"
+        if stats is None: stats = NULL_STATS
+        if dictionary is None:
+            base = {chr(i): i for i in range(256)}
+            meta_suffix = ""
+        else:
+            base = LosslessLogic.get_dictionary(dictionary)["lzw_codes"]
+            meta_suffix = f"{LosslessLogic.SUB_SEPARATOR}@{dictionary}"
+        with stats.stage("encode", bytes_in=len(text)) as st:
+            # Read-only base dictionary + the phrases this message adds
+            added = {}
+            next_code = len(base); current = ""; result = []
+            for next_char in text:
+                combined = current + next_char
+                if combined in added or combined in base: current = combined
+                else:
+                    code = added.get(current)
+                    result.append(str(base[current] if code is None else code))
+                    added[combined] = next_code
+                    next_code += 1
+                    current = next_char
+            if current:
+                code = added.get(current)
+                result.append(str(base[current] if code is None else code))
+            max_code = next_code
+            bit_width = max_code.bit_length()
+            if bit_width < 8: bit_width = 8
+            encoded_body = "|".join(result)
+            st.symbols = len(result)
+            st.bytes_out = (len(result) * bit_width + 7) // 8
+        return CompressedPackage("LZW", f"{bit_width}{meta_suffix}", encoded_body, len(result), len(result) * bit_width)
     
     @staticmethod
-    def lzw_decompress(compressed_package):
-        try: algo, meta, encoded_body = compressed_package.split(LosslessLogic.SEPARATOR, 2)
-        except ValueError: encoded_body = compressed_package
+    def lzw_decompress(compressed_package, stats=None):
+        if stats is None: stats = NULL_STATS
+        try: primer, encoded_body = LosslessLogic._lzw_header(compressed_package)
+        except ValueError as e: return str(e)
         if not encoded_body: return ""
-        codes_list = [int(x) for x in encoded_body.split("|")] if "|" in encoded_body else []
-        if not codes_list: return ""
-        dictionary = {i: chr(i) for i in range(256)}
-        next_code = 256; result = []; current = dictionary[codes_list[0]]
-        result.append(current)
-        for code in codes_list[1:]:
-            if code in dictionary: entry = dictionary[code]
-            elif code == next_code: entry = current + current[0]
-            else: entry = ""
-            result.append(entry)
-            dictionary[next_code] = current + entry[0]
-            next_code += 1
-            current = entry
-        return "".join(result)
+        with stats.stage("parse codes", bytes_in=len(encoded_body)) as st:
+            # A single code has no '|' at all
+            try: codes_list = [int(x) for x in encoded_body.split("|")]
+            except ValueError: return "Error"
+            st.symbols = len(codes_list)
+        with stats.stage("decode", symbols=len(codes_list)) as st:
+            text = LosslessLogic._lzw_decode_codes(codes_list, primer)
+            if text is None: return "Error"
+            st.bytes_out = len(text)
+        return text
+
+    @staticmethod
+    def lzw_decompress_stream(compressed_package, chunk_chars=1 << 16, window=1 << 20):
+        primer, encoded_body = LosslessLogic._lzw_header(compressed_package)
+        if not encoded_body: return iter(())
+        blocks = LosslessLogic._lzw_code_blocks(encoded_body, block_chars=chunk_chars)
+        return LosslessLogic._lzw_decode_stream(blocks, primer, window, chunk_chars)
+
+    @staticmethod
+    def _lzw_header(compressed_package):
+        """-> (primer or None, encoded body); ValueError on an unknown dictionary."""
+        try: algo, meta, encoded_body = LosslessLogic._package_fields(compressed_package)
+        except ValueError: meta, encoded_body = "", compressed_package
+        primer = None
+        if f"{LosslessLogic.SUB_SEPARATOR}@" in meta:
+            dictionary = meta.split(f"{LosslessLogic.SUB_SEPARATOR}@", 1)[1]
+            try: primer = LosslessLogic.get_dictionary(dictionary)["lzw_primer"]
+            except KeyError: raise ValueError(f"Error: unknown dictionary {dictionary}")
+        return primer, encoded_body
+
+    @staticmethod
+    def _lzw_code_blocks(encoded_body, block_chars=1 << 20):
+        """Yields the codes as int lists, about block_chars of the body at a time."""
+        n = len(encoded_body); pos = 0
+        while True:
+            end = encoded_body.find("|", pos + block_chars) if pos + block_chars < n else -1
+            piece = encoded_body[pos:] if end < 0 else encoded_body[pos:end]
+            try: yield [int(x) for x in piece.split("|")]
+            except ValueError: raise ValueError("Error")
+            if end < 0: return
+            pos = end + 1
+
+    @staticmethod
+    def _lzw_decode_stream(code_blocks, primer=None, window=1 << 20, chunk_chars=1 << 16):
+        """
+        Streaming form of _lzw_decode_codes: yields latin-1 text pieces and
+        keeps only the last 'window' output bytes. An entry whose bytes have
+        left the window is rebuilt from its chain (entry = parent entry + one
+        byte) back to an entry still at hand, and re-pointed at the copy just
+        written, so the entries in use stay inside the window.
+        """
+        from array import array
+        if primer is None:
+            prefix, length, offset = b"", array("q", [1]) * 256, array("q", [0]) * 256
+        else:
+            prefix, length, offset = primer
+        first_code = len(length)
+        length = array("q", length); offset = array("q", offset)
+        parent = array("q"); last = bytearray() # Per entry from first_code on
+        buf = bytearray(); base = 0 # buf = output bytes [base, base + len(buf))
+
+        def rebuild(code, pos):
+            chain = []
+            while code >= first_code and offset[code] < base:
+                chain.append(code)
+                code = parent[code - first_code]
+            start = offset[code]; n = length[code]
+            if code < 256: head = bytes((code,))
+            elif code < first_code: head = prefix[start:start + n]
+            else: head = buf[start - base:start - base + n]
+            for c in chain:
+                offset[c] = pos
+            return head + bytes(last[c - first_code] for c in reversed(chain))
+
+        next_code = first_code; previous = -1; previous_pos = 0; pos = 0; emitted = 0
+        for codes in code_blocks:
+            for code in codes:
+                new = -1
+                if previous >= 0:
+                    new = next_code
+                    length.append(length[previous] + 1); offset.append(previous_pos); parent.append(previous)
+                    next_code += 1
+                if not 0 <= code < next_code: raise ValueError("Error")
+                if code < 256:
+                    buf.append(code)
+                elif code == new:
+                    # Entry defined by this very code (cScSc): previous + its first byte
+                    start = previous_pos - base
+                    piece = buf[start:start + length[previous]] if start >= 0 else rebuild(previous, pos)
+                    buf += piece
+                    buf.append(piece[0])
+                else:
+                    start = offset[code]; n = length[code]
+                    if code < first_code: buf += prefix[start:start + n]
+                    elif start >= base: buf += buf[start - base:start - base + n]
+                    else: buf += rebuild(code, pos)
+                if new >= 0: last.append(buf[pos - base])
+                previous = code; previous_pos = pos
+                pos = base + len(buf)
+
+            # Hand out what is new; keep 'window' bytes for later entries
+            if len(buf) - emitted >= chunk_chars:
+                yield buf[emitted:].decode("latin-1")
+                emitted = len(buf)
+                if len(buf) > 2 * window:
+                    cut = len(buf) - window
+                    del buf[:cut]
+                    base += cut; emitted -= cut
+        if len(buf) > emitted: yield buf[emitted:].decode("latin-1")
+
+    @staticmethod
+    def _lzw_decode_codes(codes, primer=None):
+        """
+        Array-backed LZW decoder; returns None on a code that is not defined yet.
+
+        Every new entry is the previous code's string plus one byte, and the
+        output already holds exactly those bytes contiguously. So the table
+        is two integer arrays (offset of that earlier occurrence, length),
+        O(dictionary size), and each code is written into one preallocated
+        bytearray with a single slice copy; no string is built per code.
+        primer: (bytes, length, offset) of a trained dictionary; its entries
+        point into those bytes, which are placed in front of the output.
+        """
+        from array import array
+        if primer is None:
+            prefix, length, offset = b"", array("q", [1]) * 256, array("q", [0]) * 256
+        else:
+            prefix, length, offset = primer
+        first_code = len(length)
+        length = length + array("q", [1]) * len(codes)
+        offset = offset + array("q", [0]) * len(codes)
+
+        # 1. Entry lengths and total output size
+        next_code = first_code; total = 0; previous = -1
+        for code in codes:
+            if previous >= 0:
+                length[next_code] = length[previous] + 1
+                next_code += 1
+            if not 0 <= code < next_code: return None
+            total += length[code]
+            previous = code
+
+        # 2. Write every code in place
+        out = bytearray(len(prefix) + total)
+        out[:len(prefix)] = prefix
+        next_code = first_code; pos = len(prefix); previous_pos = -1
+        for code in codes:
+            if previous_pos >= 0:
+                offset[next_code] = previous_pos
+                next_code += 1
+            n = length[code]
+            start = offset[code]
+            if code < 256:
+                out[pos] = code
+            elif start + n > pos:
+                # Entry defined by this very code (cScSc): last byte = first byte
+                out[pos:pos + n - 1] = out[start:start + n - 1]
+                out[pos + n - 1] = out[start]
+            else:
+                out[pos:pos + n] = out[start:start + n]
+            previous_pos = pos
+            pos += n
+        return str(memoryview(out)[len(prefix):], "latin-1")
+
+    # ===================== LZ77 / LZSS =====================
+    # Effort level -> (chain candidates tried per position, length that ends the search, lazy matching)
+    LZ77_LEVELS = {"fast": (4, 16, False), "normal": (32, 64, True), "thorough": (1024, 258, True)}
+    LZ77_MIN_MATCH = 3
+    LZ77_LENGTH_BITS = 8 # match lengths 3..258
+    LZ77_MAX_WINDOW_BITS = 24
+
+    @staticmethod
+    def lz77_compress(text, stats=None, window_bits=15, level="normal", entropy="huffman"):
+        """
+        LZSS over a sliding window of 2**window_bits characters: every step is
+        a literal or an (offset, length) reference to text in the window,
+        found through a hash chain of 3-character prefixes (_lz77_tokens).
+        entropy "huffman" codes literals and lengths with one canonical
+        Huffman table (offsets stay window_bits wide), stored as
+        "symbol:length" pairs; "raw" writes a flag bit and fixed-width fields.
+        """
+        if not text: return ""
+        if stats is None: stats = NULL_STATS
+        if level not in LosslessLogic.LZ77_LEVELS: raise ValueError(f"Unknown LZ77 level: {level}")
+        if not 1 <= window_bits <= LosslessLogic.LZ77_MAX_WINDOW_BITS:
+            raise ValueError(f"LZ77 window_bits must be 1..{LosslessLogic.LZ77_MAX_WINDOW_BITS}, got {window_bits}")
+        with stats.stage(f"match ({level})", bytes_in=len(text)) as st:
+            symbols, offsets = LosslessLogic._lz77_tokens(text, window_bits, *LosslessLogic.LZ77_LEVELS[level])
+            st.symbols = len(symbols)
+        with stats.stage(f"encode ({entropy})", symbols=len(symbols)) as st:
+            offset_format = f"0{window_bits}b"
+            next_offset = iter(offsets).__next__
+            if entropy == "huffman":
+                counts = Counter(symbols)
+                lengths = LosslessLogic._huffman_code_lengths(list(counts.values()))
+                codes = LosslessLogic._canonical_codes(list(counts), lengths)
+                parts = []
+                for symbol in symbols:
+                    parts.append(codes[symbol])
+                    if symbol < 0: parts.append(format(next_offset() - 1, offset_format))
+                # Canonical codes: the code lengths are enough to rebuild them
+                table = ",".join(f"{symbol}:{length}" for symbol, length in zip(counts, lengths))
+            elif entropy == "raw":
+                literal_bits = max(8, max(symbols).bit_length())
+                literal_format = f"0{literal_bits}b"
+                length_format = f"0{LosslessLogic.LZ77_LENGTH_BITS}b"
+                parts = []
+                for symbol in symbols:
+                    if symbol >= 0:
+                        parts.append("0" + format(symbol, literal_format))
+                    else:
+                        parts.append("1" + format(-symbol - LosslessLogic.LZ77_MIN_MATCH, length_format)
+                                     + format(next_offset() - 1, offset_format))
+                table = str(literal_bits)
+            else:
+                raise ValueError(f"Unknown LZ77 entropy coding: {entropy}")
+            encoded_body = "".join(parts)
+            st.bytes_out = (len(encoded_body) + 7) // 8
+        meta = LosslessLogic.SUB_SEPARATOR.join((str(window_bits), entropy, table))
+        return CompressedPackage("LZ77", meta, encoded_body, len(symbols), len(encoded_body))
+
+    @staticmethod
+    def _lz77_tokens(text, window_bits, max_chain, nice_length, lazy):
+        """
+        Greedy / lazy LZSS parse. Returns (symbols, offsets): a symbol is a
+        literal's code point, or -length for a match whose offset is next in
+        offsets. head maps a 3-character prefix to its latest position and
+        prev (indexed modulo the window) links every position to the
+        previous one with the same prefix. A candidate is only measured if
+        it also matches one character past the best length so far; its
+        length is then found by binary search over slice comparisons.
+        Lazy matching emits a literal when the next position has a longer
+        match; without it (level "fast") only match starts are inserted.
+        """
+        from array import array
+        n = len(text)
+        window = 1 << window_bits; mask = window - 1
+        min_match = LosslessLogic.LZ77_MIN_MATCH
+        max_match = min_match + (1 << LosslessLogic.LZ77_LENGTH_BITS) - 1
+        head = {}
+        prev = array("q", [-1]) * window
+
+        def insert(pos):
+            key = text[pos:pos + min_match]
+            prev[pos & mask] = head.get(key, -1)
+            head[key] = pos
+
+        def longest(pos):
+            limit = min(max_match, n - pos)
+            best_length = best_offset = 0
+            if limit < min_match: return best_length, best_offset
+            candidate = head.get(text[pos:pos + min_match], -1)
+            lowest = max(pos - window, -1); tries = max_chain
+            probe = min_match - 1; probe_char = text[pos + probe]
+            while candidate > lowest and tries:
+                tries -= 1
+                if text[candidate + probe] == probe_char:
+                    low, high = min_match, limit # The shared prefix (chain key) matches, up to high may
+                    while low < high:
+                        mid = (low + high + 1) // 2
+                        if text[candidate:candidate + mid] == text[pos:pos + mid]: low = mid
+                        else: high = mid - 1
+                    if low > best_length:
+                        best_length, best_offset = low, pos - candidate
+                        if low >= nice_length or low == limit: break
+                        probe = low; probe_char = text[pos + probe]
+                candidate = prev[candidate & mask]
+            return best_length, best_offset
+
+        symbols = []; offsets = []
+        pos = 0; ahead = None # Match already found at pos by the lazy look-ahead
+        while pos < n:
+            length, offset = ahead or longest(pos)
+            ahead = None
+            insert(pos)
+            if lazy and min_match <= length < nice_length and pos + 1 < n:
+                ahead = longest(pos + 1)
+                if ahead[0] > length: length = 0
+                else: ahead = None
+            if length < min_match:
+                symbols.append(ord(text[pos]))
+                pos += 1
+                continue
+            symbols.append(-length)
+            offsets.append(offset)
+            if lazy:
+                for p in range(pos + 1, pos + length): insert(p)
+            pos += length
+        return symbols, offsets
+
+    @staticmethod
+    def lz77_decompress(compressed_package, stats=None):
+        if stats is None: stats = NULL_STATS
+        with stats.stage("decode", bytes_in=len(compressed_package)) as st:
+            try: text = "".join(LosslessLogic.lz77_decompress_stream(compressed_package))
+            except ValueError as e: return str(e)
+            st.symbols = len(text)
+            st.bytes_out = len(text)
+        return text
+
+    @staticmethod
+    def lz77_decompress_stream(compressed_package, chunk_chars=1 << 16):
+        try:
+            algo, meta, encoded_body = LosslessLogic._package_fields(compressed_package)
+            window_bits, entropy, table = meta.split(LosslessLogic.SUB_SEPARATOR, 2)
+            if entropy == "huffman":
+                pairs = [pair.split(":") for pair in table.split(",")]
+                codes = LosslessLogic._canonical_codes([int(s) for s, _ in pairs], [int(n) for _, n in pairs])
+                table = {code: symbol for symbol, code in codes.items()}
+            elif entropy == "raw": table = int(table)
+            else: raise ValueError
+            window_bits = int(window_bits)
+            if not 1 <= window_bits <= LosslessLogic.LZ77_MAX_WINDOW_BITS: raise ValueError
+        except Exception: raise ValueError("Error parsing LZ77")
+        return LosslessLogic._lz77_decode(encoded_body, window_bits, table, chunk_chars)
+
+    @staticmethod
+    def _lz77_decode(encoded_body, window_bits, table, chunk_chars=1 << 16):
+        """
+        Yields the text in pieces of about chunk_chars, keeping only the
+        last window of output for the references. table: {code: symbol}
+        (Huffman) or the literal width in bits (raw).
+        """
+        huffman = isinstance(table, dict)
+        if huffman: widths = sorted({len(code) for code in table})
+        else: literal_bits = table
+        length_bits = LosslessLogic.LZ77_LENGTH_BITS
+        window = 1 << window_bits
+        out = []; emitted = 0
+        pos = 0; n = len(encoded_body)
+        try:
+            while pos < n:
+                if huffman:
+                    for width in widths:
+                        symbol = table.get(encoded_body[pos:pos + width])
+                        if symbol is not None: break
+                    else: raise ValueError
+                    pos += width
+                elif encoded_body[pos] == "0":
+                    symbol = int(encoded_body[pos + 1:pos + 1 + literal_bits], 2)
+                    pos += 1 + literal_bits
+                else:
+                    symbol = -LosslessLogic.LZ77_MIN_MATCH - int(encoded_body[pos + 1:pos + 1 + length_bits], 2)
+                    pos += 1 + length_bits
+                if symbol >= 0:
+                    out.append(chr(symbol))
+                else:
+                    length = -symbol
+                    start = len(out) - int(encoded_body[pos:pos + window_bits], 2) - 1
+                    pos += window_bits
+                    if start < 0: raise ValueError
+                    if start + length <= len(out): out.extend(out[start:start + length])
+                    else: # Overlaps its own output: repeats the last (len(out) - start) characters
+                        for i in range(start, start + length): out.append(out[i])
+                if len(out) - emitted >= chunk_chars:
+                    yield "".join(out[emitted:])
+                    if len(out) > 2 * window: del out[:-window]
+                    emitted = len(out)
+            if pos != n: raise ValueError
+        except (ValueError, IndexError): raise ValueError("Error decoding LZ77")
+        if len(out) > emitted: yield "".join(out[emitted:])
 
     # ===================== Sizing & Ratio =====================
     @staticmethod
     def calculate_theoretical_size(compressed_package):
+        """O(1) for a CompressedPackage; package text is parsed (one pass) first."""
+        if isinstance(compressed_package, CompressedPackage): return compressed_package.theoretical_size()
         if not compressed_package: return 0.0
-        try:
-            if LosslessLogic.SEPARATOR in compressed_package:
-                parts = compressed_package.split(LosslessLogic.SEPARATOR)
-                algo = parts[0]
-                meta = parts[1]
-                encoded_body = parts[2]
-                header_overhead = len((algo + LosslessLogic.SEPARATOR + meta + LosslessLogic.SEPARATOR).encode('utf-8'))
-            else:
-                return 0.0
-
-            body_bits = 0
-            if algo == "RLE":
-                count_bits = int(meta)
-                pairs = [p for p in encoded_body.split('|') if p]
-                num_pairs = len(pairs)
-                bits_per_pair = 8 + count_bits
-                body_bits = num_pairs * bits_per_pair
-            elif algo == "LZW":
-                bit_width = int(meta)
-                codes = [c for c in encoded_body.split('|') if c]
-                body_bits = len(codes) * bit_width
-            else:
-                body_bits = len(encoded_body)
+        try: return CompressedPackage.parse(compressed_package).theoretical_size()
+        except Exception: return 0.0
 
-            body_bytes = math.ceil(body_bits / 8)
-            return header_overhead + body_bytes
-        except Exception:
-            return 0.0
+    @staticmethod
+    def _body_bits(algo, meta, encoded_body):
+        """Coded size in bits of a body read back from text."""
+        if algo == "RLE":
+            count_bits = int(meta)
+            pairs = [p for p in encoded_body.split('|') if p]
+            num_pairs = len(pairs)
+            bits_per_pair = 8 + count_bits
+            return num_pairs * bits_per_pair
+        if algo == "LZW":
+            bit_width = int(meta.split(LosslessLogic.SUB_SEPARATOR)[0])
+            codes = [c for c in encoded_body.split('|') if c]
+            return len(codes) * bit_width
+        return len(encoded_body)
 
     @staticmethod
     def get_compression_ratio(original_size_bytes, compressed_package):
         theoretical_size = LosslessLogic.calculate_theoretical_size(compressed_package)
         if theoretical_size == 0: return 0.0
-        return original_size_bytes / theoretical_size
\ No newline at end of file
+        return original_size_bytes / theoretical_size
+
+    # ===================== Dispatch & Stats =====================
+    ALGORITHMS = ("RLE", "Huffman", "Golomb", "LZW", "LZ77")
+
+    @staticmethod
+    def detect_algorithm(compressed_package):
+        algo = LosslessLogic._package_fields(compressed_package)[0]
+        return algo if algo in LosslessLogic.ALGORITHMS else None
+
+    @staticmethod
+    def _package_fields(compressed_package):
+        """[codec, meta, body] of a package object, or of package text (one split)."""
+        if isinstance(compressed_package, CompressedPackage):
+            return [compressed_package.codec, compressed_package.meta, compressed_package.body]
+        return compressed_package.split(LosslessLogic.SEPARATOR, 2)
+
+    @staticmethod
+    def compress(algo, text, stats=None, dictionary=None):
+        """Package text ("" for empty input); encode keeps the package object."""
+        package = LosslessLogic.encode(algo, text, stats=stats, dictionary=dictionary)
+        return "" if package is None else package.serialize()
+
+    @staticmethod
+    def encode(algo, text, stats=None, dictionary=None, **options):
+        """CompressedPackage of text, or None for empty input; options go to the codec (LZ77 level etc.)."""
+        # Huffman / Golomb answer empty input with legacy tuples: no package
+        if not text: return None
+        compressors = {
+            "RLE": LosslessLogic.rle_compress,
+            "Huffman": LosslessLogic.huffman_compress,
+            "Golomb": LosslessLogic.golomb_compress,
+            "LZW": LosslessLogic.lzw_compress,
+            "LZ77": LosslessLogic.lz77_compress,
+        }
+        if dictionary is not None:
+            if algo not in LosslessLogic.DICTIONARY_ALGORITHMS:
+                raise ValueError(f"{algo} has no trained dictionary")
+            return compressors[algo](text, stats=stats, dictionary=dictionary, **options)
+        return compressors[algo](text, stats=stats, **options)
+
+    @staticmethod
+    def decompress(algo, compressed_package, stats=None):
+        if not compressed_package: return ""
+        decompressors = {
+            "RLE": LosslessLogic.rle_decompress,
+            "Huffman": LosslessLogic.huffman_decompress,
+            "Golomb": LosslessLogic.golomb_decompress,
+            "LZW": LosslessLogic.lzw_decompress,
+            "LZ77": LosslessLogic.lz77_decompress,
+        }
+        return decompressors[algo](compressed_package, stats=stats)
+
+    @staticmethod
+    def decompress_stream(algo, compressed_package, chunk_chars=1 << 16):
+        """
+        decompress as a generator of text pieces (about chunk_chars each), so
+        the output is never held whole. Raises ValueError where decompress
+        would return an error text.
+        """
+        if not compressed_package: return iter(())
+        streams = {
+            "RLE": LosslessLogic.rle_decompress_stream,
+            "Huffman": LosslessLogic.huffman_decompress_stream,
+            "Golomb": LosslessLogic.golomb_decompress_stream,
+            "LZW": LosslessLogic.lzw_decompress_stream,
+            "LZ77": LosslessLogic.lz77_decompress_stream,
+        }
+        return streams[algo](compressed_package, chunk_chars=chunk_chars)
+
+    @staticmethod
+    def decompress_to_file(algo, compressed_package, path, preview_chars=2000, stats=None):
+        """
+        Streams the decoded text into 'path' (UTF-8) while decoding; a failed
+        decode removes the partial file and raises ValueError.
+        Returns (characters written, the first preview_chars of them).
+        """
+        if stats is None: stats = NULL_STATS
+        preview = []; kept = 0; written = 0
+        with stats.stage("decode to file", bytes_in=len(compressed_package)) as st:
+            try:
+                with open(path, "w", encoding="utf-8", newline="") as f:
+                    for piece in LosslessLogic.decompress_stream(algo, compressed_package):
+                        f.write(piece)
+                        written += len(piece)
+                        if kept < preview_chars:
+                            preview.append(piece[:preview_chars - kept])
+                            kept += len(preview[-1])
+                    st.bytes_out = f.tell()
+            except ValueError:
+                import os
+                os.remove(path)
+                raise
+            st.symbols = written
+        return written, "".join(preview)
+
+    @staticmethod
+    def compress_with_stats(algo, text, profile=False, trace_memory=False, dictionary=None, **options):
+        """Returns (CompressedPackage or None, CompressionStats) incl. the size query."""
+        from instrumentation import CompressionStats
+        stats = CompressionStats(f"{algo} compress", profile=profile, trace_memory=trace_memory)
+        with stats.session():
+            package = LosslessLogic.encode(algo, text, stats=stats, dictionary=dictionary, **options)
+            with stats.stage("theoretical size", bytes_in=len(package or "")) as st:
+                st.bytes_out = LosslessLogic.calculate_theoretical_size(package)
+        return package, stats
+
+    @staticmethod
+    def decompress_with_stats(algo, compressed_package, profile=False, trace_memory=False):
+        """Returns (text, CompressionStats)."""
+        from instrumentation import CompressionStats
+        stats = CompressionStats(f"{algo} decompress", profile=profile, trace_memory=trace_memory)
+        with stats.session():
+            text = LosslessLogic.decompress(algo, compressed_package, stats=stats)
+        return text, stats
+
+    # ===================== Codec Comparison =====================
+    @staticmethod
+    def compare_codecs(text, algos=None, workers=None, with_stats=False):
+        """
+        Compresses text with every codec in algos at the same time, one
+        process each (default: as many as there are CPUs). The input sits
+        once in shared memory (only its name is pickled per codec) and sizes
+        are measured in the workers. With a single worker it all runs here.
+        Returns the rows ranked smallest first: dicts with algo, package (object),
+        theoretical_size, physical_size, cr, seconds, stats (or None) and
+        error (None, or the failure text of a codec that raised; its
+        package is None and its sizes 0).
+        """
+        import os
+        algos = list(algos or LosslessLogic.ALGORITHMS)
+        raw = text.encode("utf-8")
+        if not raw or not algos: return []
+        workers = min(len(algos), workers or os.cpu_count() or 1)
+        if workers == 1:
+            rows = [LosslessLogic._compare_row(text, len(raw), algo, with_stats) for algo in algos]
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+            from multiprocessing import shared_memory
+            shm = shared_memory.SharedMemory(create=True, size=len(raw))
+            try:
+                shm.buf[:len(raw)] = raw
+                jobs = [(shm.name, len(raw), algo, with_stats) for algo in algos]
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    rows = list(pool.map(_compare_job, jobs))
+            finally:
+                shm.close()
+                shm.unlink()
+        # Failed codecs (size 0) go last
+        rows.sort(key=lambda row: (row["theoretical_size"] == 0, row["theoretical_size"]))
+        return rows
+
+    @staticmethod
+    def _compare_row(text, size, algo, with_stats):
+        import time
+        start = time.perf_counter()
+        try:
+            if with_stats:
+                package, stats = LosslessLogic.compress_with_stats(algo, text)
+            else:
+                package, stats = LosslessLogic.encode(algo, text), None
+        except Exception as e:
+            # One codec failing (e.g. LZW outside latin-1) leaves the others ranked
+            return {"algo": algo, "package": None, "theoretical_size": 0, "physical_size": 0, "cr": 0.0,
+                    "seconds": time.perf_counter() - start, "stats": None, "error": f"{type(e).__name__}: {e}"}
+        seconds = time.perf_counter() - start
+        theoretical_size = package.theoretical_size()
+        return {
+            "algo": algo,
+            "package": package,
+            "theoretical_size": theoretical_size,
+            # The file size needs the text itself: built here, in the worker
+            "physical_size": len(package.serialize().encode("utf-8")),
+            "cr": package.compression_ratio(size),
+            "seconds": seconds,
+            "stats": stats,
+            "error": None,
+        }
+
+    @staticmethod
+    def comparison_table(rows, original_size):
+        """Fixed-width ranking of compare_codecs rows (for the GUI and CLI)."""
+        lines = [f"Original: {original_size} B",
+                 f"{'#':<4}{'Codec':<10}{'Theo. size (B)':>16}{'File (B)':>12}{'CR':>8}{'Time (ms)':>11}"]
+        for rank, row in enumerate(rows, 1):
+            if row["error"]:
+                lines.append(f"{rank:<4}{row['algo']:<10}  failed: {row['error']}")
+                continue
+            lines.append(f"{rank:<4}{row['algo']:<10}{row['theoretical_size']:>16.0f}{row['physical_size']:>12}"
+                         f"{row['cr']:>8.2f}{row['seconds'] * 1000:>11.1f}")
+        return "\n".join(lines)
+
+    # ===================== Trained Dictionaries =====================
+    # Static Huffman table + primed LZW dictionary trained on a sample corpus,
+    # referenced by packages as "@<id>" instead of being embedded
+    DICTIONARY_ALGORITHMS = ("Huffman", "LZW")
+    _dictionaries = {}
+
+    @staticmethod
+    def train_dictionary(corpus, dictionary_id=None, lzw_entries=4096):
+        """
+        Trains and registers a dictionary from sample text; returns its ID.
+        - Huffman: counts of the corpus characters over 0-255, plus one for
+          every byte so any latin-1 message can be coded.
+        - LZW: the phrases LZW adds while coding the start of the corpus, up
+          to lzw_entries of them.
+        """
+        counts = [1] * 256
+        for char, count in Counter(corpus).items():
+            if ord(char) < 256: counts[ord(char)] += count
+
+        # Cut the corpus where LZW has added lzw_entries phrases
+        latin = "".join(c for c in corpus if c <= "\xff")
+        dictionary = {chr(i): i for i in range(256)}
+        current = ""; cut = 0
+        for i, next_char in enumerate(latin):
+            combined = current + next_char
+            if combined in dictionary: current = combined
+            else:
+                if len(dictionary) == 256 + lzw_entries: break
+                dictionary[combined] = len(dictionary)
+                current = next_char; cut = i + 1
+        primer = latin[:cut]
+
+        if dictionary_id is None:
+            import hashlib
+            dictionary_id = "d" + hashlib.sha1(corpus.encode("utf-8")).hexdigest()[:8]
+        LosslessLogic.register_dictionary(dictionary_id, counts, primer)
+        return dictionary_id
+
+    @staticmethod
+    def register_dictionary(dictionary_id, huffman_counts, lzw_primer):
+        """Builds the encode/decode tables once, so messages skip the table build."""
+        if not dictionary_id or not all(c.isalnum() or c in "_-." for c in dictionary_id):
+            raise ValueError(f"Invalid dictionary ID: {dictionary_id!r}")
+        from array import array
+        symbols = [chr(i) for i in range(256)]
+        codes = LosslessLogic._canonical_codes(symbols, LosslessLogic._huffman_code_lengths(huffman_counts))
+
+        # Primed LZW: phrase -> code for the encoder; offsets / lengths into
+        # the primer text for the decoder (see _lzw_decode_codes)
+        lzw_codes = {chr(i): i for i in range(256)}
+        length = array("q", [1]) * 256; offset = array("q", [0]) * 256
+        current = ""; pos = 0
+        for next_char in lzw_primer:
+            combined = current + next_char
+            if combined in lzw_codes: current = combined
+            else:
+                lzw_codes[combined] = len(lzw_codes)
+                # New entry = the phrase just emitted + one byte, where it stands
+                length.append(len(combined)); offset.append(pos)
+                pos += len(current)
+                current = next_char
+
+        LosslessLogic._dictionaries[dictionary_id] = {
+            "id": dictionary_id,
+            "huffman_counts": list(huffman_counts),
+            "huffman_codes": codes,
+            "huffman_rows": LosslessLogic._huffman_rows([codes[s] for s in symbols]),
+            "lzw_text": lzw_primer,
+            "lzw_codes": lzw_codes,
+            "lzw_primer": (lzw_primer.encode("latin-1"), length, offset),
+        }
+        return dictionary_id
+
+    @staticmethod
+    def get_dictionary(dictionary_id):
+        """Registered dictionary by ID (KeyError if it was never trained / loaded)."""
+        return LosslessLogic._dictionaries[dictionary_id]
+
+    @staticmethod
+    def save_dictionary(dictionary_id, path):
+        import json
+        trained = LosslessLogic.get_dictionary(dictionary_id)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"id": dictionary_id, "huffman_counts": trained["huffman_counts"],
+                       "lzw_primer": trained["lzw_text"]}, f)
+
+    @staticmethod
+    def load_dictionary(path):
+        """Registers a dictionary saved by save_dictionary; returns its ID."""
+        import json
+        with open(path, "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        return LosslessLogic.register_dictionary(saved["id"], saved["huffman_counts"], saved["lzw_primer"])
+
+
+def _compare_job(job):
+    # Module-level so the process pool can pickle it
+    from multiprocessing import shared_memory
+    name, size, algo, with_stats = job
+    # Pool workers share the parent's resource tracker: the parent's unlink covers this
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        text = str(shm.buf[:size], "utf-8")
+    finally:
+        shm.close()
+    return LosslessLogic._compare_row(text, size, algo, with_stats)
@@ -2,6 +2,11 @@ import numpy as np
 from PIL import Image
 import os
 import io
+from collections import Counter
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from instrumentation import CompressionStats, NULL_STATS
+from lossless_algorithms import LosslessLogic
 
 class LossyLogic:
     
@@ -11,33 +16,47 @@ class LossyLogic:
         x = np.array(data, dtype=float).flatten()
         x = np.clip(x, 0, full_scale - 1)
 
-        L = 2 ** bit_size  # number of levels
+        # Cluster the distinct values weighted by their counts: same result as
+        # clustering every sample, but the distance matrix is at most 256 wide.
+        values, weights = np.unique(x, return_counts=True)
+        centroids = LossyLogic._lbg_centroids(bit_size, values, weights, epsilon)
+
+        return LossyLogic.table_from_centroids(centroids, full_scale)
+
+    @staticmethod
+    def _lbg_centroids(bit_size, values, weights, epsilon=1.0):
+        for _, centroids in LossyLogic._lbg_stages(bit_size, values, weights, epsilon):
+            pass
+        return centroids
+
+    @staticmethod
+    def _lbg_stages(max_bits, values, weights, epsilon=1.0):
+        """Yields (bits, sorted centroids) for every level the splitting passes through."""
+        L = 2 ** max_bits  # number of levels
 
         # 1) Start with one centroid = global average
-        centroids = np.array([x.mean()], dtype=float)
+        centroids = np.array([np.average(values, weights=weights)], dtype=float)
+        yield 0, centroids.copy()
 
         # 2) Splitting until we reach L centroids
         while len(centroids) < L:
-            new_centroids = []
-            for c in centroids:
-                new_centroids.append(c - epsilon)
-                new_centroids.append(c + epsilon)
-
-            centroids = np.array(new_centroids, dtype=float)
-
-            try:
-                distances = np.abs(x[:, None] - centroids[None, :])
-                labels = np.argmin(distances, axis=1)
-            except MemoryError:
-                print("Image too large for vectorized clustering.")
-                return {} 
-
-            for k in range(len(centroids)):
-                cluster_points = x[labels == k]
-                if len(cluster_points) > 0:
-                    centroids[k] = cluster_points.mean()
-
-        centroids = np.sort(centroids)
+            centroids = np.column_stack((centroids - epsilon, centroids + epsilon)).flatten()
+            LossyLogic._lloyd_update(values, weights, centroids)
+            yield int(np.log2(len(centroids))), np.sort(centroids)
+
+    @staticmethod
+    def _lloyd_update(values, weights, centroids):
+        """One in-place assignment/update pass; empty clusters keep their centroid."""
+        labels = np.argmin(np.abs(values[:, None] - centroids[None, :]), axis=1)
+        sums = np.bincount(labels, weights=values * weights, minlength=len(centroids))
+        counts = np.bincount(labels, weights=weights, minlength=len(centroids))
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled]
+        return centroids
+
+    @staticmethod
+    def table_from_centroids(centroids, full_scale=256):
+        centroids = np.sort(np.asarray(centroids, dtype=float))
         L = len(centroids)
 
         boundaries = np.zeros(L + 1, dtype=float)
@@ -58,6 +77,30 @@ class LossyLogic:
 
         return table
 
+    @staticmethod
+    def table_centroids(table):
+        """Centroids of a table ordered by quantization index."""
+        levels = sorted(table.values())
+        return np.array([centroid for _, centroid in levels], dtype=float)
+
+    @staticmethod
+    def quantize_with_table(pixels, table, full_scale=256):
+        """Map every pixel to its centroid through a lookup table."""
+        pixels = np.asarray(pixels)
+        lut = np.zeros(full_scale, dtype=pixels.dtype)
+        for (low, high), (index, centroid) in table.items():
+            # A split centroid left without members can sit at full_scale
+            lut[low:high] = min(centroid, full_scale - 1)
+        return lut[pixels]
+
+    @staticmethod
+    def table_index_lut(table, full_scale=256):
+        """Quantization index of every possible pixel value."""
+        lut = np.zeros(full_scale, dtype=np.int64)
+        for (low, high), (index, centroid) in table.items():
+            lut[low:high] = index
+        return lut
+
     @staticmethod
     def quantization_mse(original, reconstructed):
         """Compute Mean Squared Error."""
@@ -66,15 +109,24 @@ class LossyLogic:
         return np.mean((original - reconstructed) ** 2)
 
     @staticmethod
-    def run_quantization(original_image_pil, bit_size, file_path_on_disk):
+    def run_quantization(original_image_pil, bit_size, file_path_on_disk, table=None, size_estimate="png",
+                         stats=None):
         """
         Calculates CR based on ACTUAL FILE SIZES (Disk vs Buffer).
+        A ready table (e.g. from rate_distortion_sweep) skips training.
+        size_estimate: "png" (exact optimized PNG encode), or a fast
+        estimate "zlib" / "entropy" (see estimate_compressed_size).
         """
+        if stats is None: stats = NULL_STATS
+
         # 1. Prepare Data
-        img_gray = original_image_pil.convert("L")
-        img_np = np.array(img_gray)
-        original_shape = img_np.shape
-        flat_pixels = img_np.flatten()
+        with stats.stage("prepare") as st:
+            img_gray = original_image_pil.convert("L")
+            img_np = np.array(img_gray)
+            original_shape = img_np.shape
+            flat_pixels = img_np.flatten()
+            st.symbols = flat_pixels.size
+            st.bytes_out = flat_pixels.nbytes
         
         # --- ACTUAL ORIGINAL FILE SIZE (From Disk) ---
         if file_path_on_disk and os.path.exists(file_path_on_disk):
@@ -84,25 +136,34 @@ class LossyLogic:
             original_size_bytes = flat_pixels.nbytes
 
         # 2. Generate Table
-        table = LossyLogic.make_nonuniform_table(bit_size, flat_pixels, full_scale=256)
+        if table is None:
+            with stats.stage("make_nonuniform_table", bytes_in=flat_pixels.nbytes, symbols=2 ** bit_size):
+                table = LossyLogic.make_nonuniform_table(bit_size, flat_pixels, full_scale=256)
         
         # 3. Encode (Quantize)
-        reconstructed_flat = np.zeros_like(flat_pixels)
-        for (low, high), (index, centroid) in table.items():
-            mask = (flat_pixels >= low) & (flat_pixels < high)
-            reconstructed_flat[mask] = centroid
+        with stats.stage("quantize", bytes_in=flat_pixels.nbytes, symbols=flat_pixels.size):
+            reconstructed_flat = LossyLogic.quantize_with_table(flat_pixels, table)
             
         # 4. Calculate MSE
-        mse = LossyLogic.quantization_mse(flat_pixels, reconstructed_flat)
+        with stats.stage("mse", symbols=flat_pixels.size):
+            mse = LossyLogic.quantization_mse(flat_pixels, reconstructed_flat)
         
         # 5. Reconstruct Image Object
-        img_reconstructed_np = reconstructed_flat.reshape(original_shape).astype(np.uint8)
-        reconstructed_image_pil = Image.fromarray(img_reconstructed_np, mode="L")
+        with stats.stage("build image"):
+            img_reconstructed_np = reconstructed_flat.reshape(original_shape).astype(np.uint8)
+            reconstructed_image_pil = Image.fromarray(img_reconstructed_np, mode="L")
 
-        # the file would be if we saved it to disk right now (as PNG).
-        buffer = io.BytesIO()
-        reconstructed_image_pil.save(buffer, format="PNG", optimize=True)
-        compressed_size_bytes = buffer.tell() # Get the size of the buffer
+        with stats.stage(f"size ({size_estimate})", bytes_in=flat_pixels.nbytes) as st:
+            if size_estimate == "png":
+                # the file would be if we saved it to disk right now (as PNG).
+                buffer = io.BytesIO()
+                reconstructed_image_pil.save(buffer, format="PNG", optimize=True)
+                compressed_size_bytes = buffer.tell() # Get the size of the buffer
+            else:
+                indices = LossyLogic.table_index_lut(table)[img_np]
+                compressed_size_bytes = LossyLogic.estimate_compressed_size(
+                    indices, len(table), method=size_estimate)
+            st.bytes_out = compressed_size_bytes
         
         # --- COMPRESSION RATIO ---
         if compressed_size_bytes > 0:
@@ -110,4 +171,679 @@ class LossyLogic:
         else:
             cr = 0.0
         
-        return reconstructed_image_pil, mse, cr
\ No newline at end of file
+        return reconstructed_image_pil, mse, cr
+
+    @staticmethod
+    def run_with_stats(method, original_image_pil, level, file_path_on_disk, profile=False,
+                       trace_memory=False, **kwargs):
+        """
+        run_quantization ("quant", level = bit depth) or dct_compress ("dct",
+        level = quality) with instrumentation.
+        Returns (image, mse, cr, CompressionStats).
+        """
+        stats = CompressionStats(f"{method} level {level}", profile=profile, trace_memory=trace_memory)
+        with stats.session():
+            if method == "dct":
+                result = LossyLogic.dct_compress(original_image_pil, level, file_path_on_disk, stats=stats)
+            else:
+                result = LossyLogic.run_quantization(original_image_pil, level, file_path_on_disk,
+                                                     stats=stats, **kwargs)
+        return result + (stats,)
+
+    # ===================== Progressive Preview =====================
+    @staticmethod
+    def preview_compress(original_image_pil, level, file_path_on_disk, method="quant",
+                         table=None, max_size=(400, 350), preview_image=None, histogram=None):
+        """
+        Fast first pass for display (level = bit depth, or DCT quality).
+        Only the downscaled copy is reconstructed; MSE and CR are estimated
+        from the full-resolution histogram and a few row bands (the only
+        rows converted to gray), so they stay close to what the full pass
+        will report.
+        A ready downscaled copy (preview_image) / gray histogram (e.g. the
+        one given to rate_distortion_sweep) skips the resize / full scan.
+        Returns (preview image, MSE estimate, CR estimate).
+        """
+        if preview_image is None:
+            preview_image = original_image_pil.copy()
+            preview_image.thumbnail(max_size)
+        preview = preview_image
+        width, height = original_image_pil.size
+        bands = LossyLogic._row_band_gray(original_image_pil)
+
+        if file_path_on_disk and os.path.exists(file_path_on_disk):
+            original_size_bytes = os.path.getsize(file_path_on_disk)
+        else:
+            original_size_bytes = width * height
+
+        if method == "dct":
+            result = LossyLogic.dct_compress(preview, level, None)[0]
+            # Bands of 16 rows keep whole 8x8 blocks
+            _, mse, band_cr = LossyLogic.dct_compress(Image.fromarray(bands, mode="L"), level, None)
+            estimated_bytes = width * height / band_cr if band_cr > 0 else 0
+        else:
+            if histogram is None:
+                histogram = LossyLogic.gray_histogram(original_image_pil)
+            if table is None:
+                table = LossyLogic.table_from_histogram(level, histogram)
+            preview_np = np.asarray(preview.convert("L"))
+            result = Image.fromarray(LossyLogic.quantize_with_table(preview_np, table).astype(np.uint8), mode="L")
+            mse, _ = LossyLogic.histogram_stats(histogram, table)
+            estimated_bytes = LossyLogic.estimate_compressed_size(
+                LossyLogic.table_index_lut(table)[bands], len(table), method="zlib", height=height)
+
+        cr = original_size_bytes / estimated_bytes if estimated_bytes > 0 else 0.0
+        return result, mse, cr
+
+    @staticmethod
+    def _band_starts(height, bands=16, band_rows=16):
+        band_rows = min(band_rows, height)
+        return np.unique(np.linspace(0, height - band_rows, max(1, min(bands, height // band_rows))).astype(int))
+
+    @staticmethod
+    def _row_bands(array, bands=16, band_rows=16):
+        """Evenly spaced bands of rows stacked into one array (a cheap sample)."""
+        height = array.shape[0]
+        band_rows = min(band_rows, height)
+        return np.concatenate([array[s:s + band_rows] for s in LossyLogic._band_starts(height, bands, band_rows)])
+
+    @staticmethod
+    def _row_band_gray(image_pil, bands=16, band_rows=16):
+        """_row_bands of the gray image, converting only the sampled rows."""
+        width, height = image_pil.size
+        band_rows = min(band_rows, height)
+        return np.concatenate([np.asarray(image_pil.crop((0, s, width, s + band_rows)).convert("L"))
+                               for s in LossyLogic._band_starts(height, bands, band_rows)])
+
+    # ===================== Rate-Distortion Sweep =====================
+    @staticmethod
+    def histogram_stats(histogram, table):
+        """
+        MSE and estimated size (bytes) of quantizing a histogram with a table.
+        Size = index entropy of every pixel + one byte per table level.
+        """
+        histogram = np.asarray(histogram, dtype=float)
+        total = histogram.sum()
+        if total == 0:
+            return 0.0, 0
+        values = np.arange(len(histogram), dtype=float)
+        reconstructed = LossyLogic.quantize_with_table(np.arange(len(histogram)), table, len(histogram))
+        mse = float(np.sum(histogram * (values - reconstructed) ** 2) / total)
+
+        index_counts = np.bincount(LossyLogic.table_index_lut(table, len(histogram)),
+                                   weights=histogram)
+        return mse, LossyLogic._entropy_size(index_counts, len(table))
+
+    @staticmethod
+    def _entropy_size(index_counts, levels):
+        index_counts = np.asarray(index_counts, dtype=float)
+        total = index_counts.sum()
+        if total == 0:
+            return levels
+        p = index_counts[index_counts > 0] / total
+        entropy_bits = float(-np.sum(p * np.log2(p)))
+        return int(np.ceil(total * entropy_bits / 8)) + levels
+
+    @staticmethod
+    def estimate_compressed_size(indices, levels, method="zlib", bands=16, band_rows=16, height=None):
+        """
+        Fast size estimate (bytes) of a quantized image from its 2-D index map.
+        - "entropy": order-0 entropy of the index histogram (analytic, ignores
+          spatial redundancy, so it is an upper bound for PNG).
+        - "zlib": evenly spaced row bands packed at the PNG palette bit depth
+          of the largest index, run through a PNG-style per-row filter pass
+          (None / Sub / Up, whichever has the smallest sum of absolute
+          values) and zlib level 1, scaled up to the full height. On the
+          bundled examples it lands within about 30% of the optimized PNG
+          encode; smooth images at 6-8 bits come out high because there are
+          no Average / Paeth filters.
+        Both add one byte per table level.
+        height: full image height when indices already are the "zlib" row
+        bands (_row_bands); they are then used as the sample as is.
+        """
+        indices = np.asarray(indices)
+        if method == "entropy":
+            return LossyLogic._entropy_size(np.bincount(indices.ravel(), minlength=levels), levels)
+        if method != "zlib":
+            raise ValueError(f"Unknown size estimate: {method}")
+        if indices.ndim == 1:
+            indices = indices[None, :]
+
+        if height is None:
+            height = indices.shape[0]
+            sample = LossyLogic._row_bands(indices, bands, band_rows).astype(np.uint8)
+        else:
+            sample = indices.astype(np.uint8)
+
+        # PNG palette depths are 1, 2, 4 or 8 bits per pixel
+        used_levels = int(sample.max()) + 1 if sample.size else 1
+        depth = next(d for d in (1, 2, 4, 8) if used_levels <= 2 ** d)
+        bits = np.unpackbits(sample[..., None], axis=-1)[..., 8 - depth:]
+        packed = np.packbits(bits.reshape(sample.shape[0], -1), axis=1)
+
+        # Filter pass per band (Up reads the previous row of the same band)
+        band_height = min(band_rows, height)
+        rows = packed.reshape(-1, band_height, packed.shape[1]).astype(np.int16)
+        previous = np.zeros_like(rows)
+        previous[:, 1:] = rows[:, :-1]
+        left = np.zeros_like(rows)
+        left[..., 1:] = rows[..., :-1]
+        candidates = np.stack([rows, (rows - left) % 256, (rows - previous) % 256]).astype(np.uint8)
+        cost = np.abs(candidates.astype(np.int8).astype(np.int16)).sum(axis=-1)
+        choice = cost.argmin(axis=0)
+        filtered = np.take_along_axis(candidates, choice[None, ..., None], axis=0)[0]
+        stream = np.concatenate((choice[..., None].astype(np.uint8), filtered), axis=-1)
+
+        sample_bytes = len(zlib.compress(stream.tobytes(), 1))
+        return int(np.ceil(sample_bytes * height / sample.shape[0])) + levels
+
+    @staticmethod
+    def rate_distortion_sweep(original_image_pil, max_bits=8, full_scale=256, epsilon=1.0, histogram=None):
+        """
+        Tables, MSE and estimated size for every bit depth 1..max_bits from a
+        single LBG run (the splitting passes through every power of two).
+        A ready gray histogram skips the scan of the image.
+        Returns {bits: {"table", "mse", "estimated_size"}}.
+        """
+        if histogram is None:
+            histogram = LossyLogic.gray_histogram(original_image_pil, full_scale)
+        values = np.flatnonzero(histogram).astype(float)
+        weights = histogram[histogram > 0]
+
+        sweep = {}
+        for bits, centroids in LossyLogic._lbg_stages(max_bits, values, weights, epsilon):
+            if bits == 0:
+                continue
+            table = LossyLogic.table_from_centroids(centroids, full_scale)
+            mse, estimated_size = LossyLogic.histogram_stats(histogram, table)
+            sweep[bits] = {"table": table, "mse": mse, "estimated_size": estimated_size}
+        return sweep
+
+    @staticmethod
+    def rate_control(original_image_pil, file_path_on_disk, target_mse=None, target_bytes=None, max_bits=8,
+                     size_estimate="zlib", refine_iterations=3, stats=None):
+        """
+        Picks the bit depth and codebook for a target MSE (fewest bits that
+        reach it) or a target size in bytes (lowest MSE that fits), from one
+        gray histogram: one LBG run gives every depth's table
+        (rate_distortion_sweep), a few warm Lloyd passes refine each, and
+        sizes are estimated ("zlib" on row bands, or "entropy"). Only the
+        chosen table is applied and PNG-encoded; the MSE from the histogram
+        is exact, but a size estimate can fall short, in which case the
+        next smaller depth is encoded too.
+        Returns (image, mse, cr, choice) with choice = {"bits", "table",
+        "estimated_mse", "estimated_size", "size", "met"}; met says whether
+        the target was reached (the smallest / largest depth is used if not).
+        """
+        if (target_mse is None) == (target_bytes is None):
+            raise ValueError("Give exactly one of target_mse / target_bytes")
+        if stats is None: stats = NULL_STATS
+
+        # 1. Candidates from one histogram
+        with stats.stage("histogram") as st:
+            histogram = LossyLogic.gray_histogram(original_image_pil)
+            bands = LossyLogic._row_band_gray(original_image_pil) if size_estimate == "zlib" else None
+            st.symbols = int(histogram.sum())
+        with stats.stage("search", symbols=max_bits) as st:
+            candidates = []
+            for bits, entry in LossyLogic.rate_distortion_sweep(
+                    original_image_pil, max_bits, histogram=histogram).items():
+                table = LossyLogic.refine_table(entry["table"], histogram, refine_iterations)
+                mse, size = LossyLogic.histogram_stats(histogram, table)
+                if bands is not None:
+                    size = LossyLogic.estimate_compressed_size(
+                        LossyLogic.table_index_lut(table)[bands], len(table), method="zlib",
+                        height=original_image_pil.size[1])
+                candidates.append({"bits": bits, "table": table, "estimated_mse": mse, "estimated_size": size})
+
+            # 2. Fewest bits reaching the MSE / most bits fitting the size
+            if target_mse is not None:
+                reached = [c for c in candidates if c["estimated_mse"] <= target_mse]
+                pick = candidates.index(reached[0]) if reached else len(candidates) - 1
+            else:
+                fitting = [c for c in candidates if c["estimated_size"] <= target_bytes]
+                pick = candidates.index(fitting[-1]) if fitting else 0
+            st.bytes_out = candidates[pick]["estimated_size"]
+
+        # 3. The real encode (again one depth down while it overshoots the size)
+        if file_path_on_disk and os.path.exists(file_path_on_disk):
+            original_size_bytes = os.path.getsize(file_path_on_disk)
+        else:
+            original_size_bytes = original_image_pil.size[0] * original_image_pil.size[1]
+        while True:
+            choice = dict(candidates[pick])
+            image, mse, cr = LossyLogic.run_quantization(
+                original_image_pil, choice["bits"], file_path_on_disk, table=choice["table"], stats=stats)
+            choice["size"] = int(round(original_size_bytes / cr)) if cr > 0 else 0
+            if target_bytes is None or choice["size"] <= target_bytes or pick == 0:
+                break
+            pick -= 1
+        choice["met"] = mse <= target_mse if target_mse is not None else choice["size"] <= target_bytes
+        return image, mse, cr, choice
+
+    # ===================== Shared Codebook (Batch) =====================
+    IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+    @staticmethod
+    def list_images(directory):
+        names = sorted(os.listdir(directory))
+        return [os.path.join(directory, n) for n in names
+                if n.lower().endswith(LossyLogic.IMAGE_EXTENSIONS)]
+
+    @staticmethod
+    def gray_histogram(image_pil, full_scale=256):
+        pixels = np.asarray(image_pil.convert("L")).ravel()
+        return np.bincount(pixels, minlength=full_scale)
+
+    @staticmethod
+    def train_shared_table(image_paths, bit_size, sample_images=64, full_scale=256, epsilon=1.0):
+        """
+        Trains one table from the pooled histogram of an evenly spaced
+        sample of the images (all of them if there are fewer).
+        """
+        if not image_paths:
+            return {}
+        step = max(1, len(image_paths) // sample_images)
+        pooled = np.zeros(full_scale, dtype=np.int64)
+        for path in image_paths[::step][:sample_images]:
+            with Image.open(path) as img:
+                pooled += LossyLogic.gray_histogram(img, full_scale)
+        return LossyLogic.table_from_histogram(bit_size, pooled, full_scale, epsilon)
+
+    @staticmethod
+    def table_from_histogram(bit_size, histogram, full_scale=256, epsilon=1.0):
+        histogram = np.asarray(histogram)
+        values = np.flatnonzero(histogram).astype(float)
+        centroids = LossyLogic._lbg_centroids(bit_size, values, histogram[histogram > 0], epsilon)
+        return LossyLogic.table_from_centroids(centroids, full_scale)
+
+    @staticmethod
+    def refine_table(table, histogram, iterations=3, full_scale=256):
+        """Warm-start Lloyd iterations from an existing table's centroids."""
+        histogram = np.asarray(histogram)
+        values = np.flatnonzero(histogram).astype(float)
+        if len(values) == 0:
+            return table
+        weights = histogram[histogram > 0]
+        centroids = LossyLogic.table_centroids(table)
+        for _ in range(iterations):
+            previous = centroids.copy()
+            LossyLogic._lloyd_update(values, weights, centroids)
+            if np.allclose(previous, centroids):
+                break
+        return LossyLogic.table_from_centroids(centroids, full_scale)
+
+    @staticmethod
+    def histogram_signature(histogram, bins=64):
+        """Histogram pooled into 'bins' bins and normalized to sum 1."""
+        histogram = np.asarray(histogram, dtype=float)
+        pooled = histogram.reshape(bins, -1).sum(axis=1)
+        total = pooled.sum()
+        return pooled / total if total > 0 else pooled
+
+    @staticmethod
+    def histogram_drift(signature_a, signature_b):
+        """Share of pixel mass that moved between two signatures (0 = same, 1 = disjoint)."""
+        return 0.5 * float(np.abs(signature_a - signature_b).sum())
+
+    @staticmethod
+    def quantize_file(image_path, table, output_path, refine_iterations=0):
+        """
+        Applies a ready table to one image file and saves the result as PNG.
+        Returns (output_path, mse, cr) with CR from the two files on disk.
+        """
+        with Image.open(image_path) as img:
+            img_np = np.array(img.convert("L"))
+
+        if refine_iterations > 0:
+            histogram = np.bincount(img_np.ravel(), minlength=256)
+            table = LossyLogic.refine_table(table, histogram, refine_iterations)
+
+        reconstructed = LossyLogic.quantize_with_table(img_np, table)
+        mse = LossyLogic.quantization_mse(img_np, reconstructed)
+        Image.fromarray(reconstructed.astype(np.uint8), mode="L").save(output_path, format="PNG")
+
+        compressed_size_bytes = os.path.getsize(output_path)
+        cr = os.path.getsize(image_path) / compressed_size_bytes if compressed_size_bytes > 0 else 0.0
+        return output_path, mse, cr
+
+    @staticmethod
+    def output_names(image_paths):
+        """
+        <stem>.png per image; stems shared by several files (img0.jpg and
+        img0.png) keep their extension instead (img0.jpg.png, img0.png.png).
+        """
+        stems = [os.path.splitext(os.path.basename(path))[0] for path in image_paths]
+        shared = Counter(stem.lower() for stem in stems)
+        return [f"{stem}.png" if shared[stem.lower()] == 1 else f"{os.path.basename(path)}.png"
+                for path, stem in zip(image_paths, stems)]
+
+    @staticmethod
+    def batch_quantize_directory(input_dir, output_dir, bit_size, workers=None,
+                                 refine_iterations=0, sample_images=64, table=None):
+        """
+        Quantizes every image in input_dir with one shared table (trained once
+        unless given) across a process pool.
+        Returns (table, [(image_path, output_path, mse, cr), ...]).
+        """
+        image_paths = LossyLogic.list_images(input_dir)
+        if not image_paths:
+            return table or {}, []
+        if table is None:
+            table = LossyLogic.train_shared_table(image_paths, bit_size, sample_images)
+
+        os.makedirs(output_dir, exist_ok=True)
+        jobs = []
+        for path, name in zip(image_paths, LossyLogic.output_names(image_paths)):
+            jobs.append((path, table, os.path.join(output_dir, name), refine_iterations))
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunksize = max(1, len(jobs) // ((workers or os.cpu_count() or 1) * 4))
+            results = list(pool.map(_quantize_file_job, jobs, chunksize=chunksize))
+
+        return table, [(path,) + result for path, result in zip(image_paths, results)]
+
+
+    # ===================== Transform Coding (8x8 DCT) =====================
+    BLOCK = 8
+
+    # Standard JPEG luminance table (quality 50)
+    JPEG_LUMA_QUANT = np.array([
+        [16, 11, 10, 16, 24, 40, 51, 61],
+        [12, 12, 14, 19, 26, 58, 60, 55],
+        [14, 13, 16, 24, 40, 57, 69, 56],
+        [14, 17, 22, 29, 51, 87, 80, 62],
+        [18, 22, 37, 56, 68, 109, 103, 77],
+        [24, 35, 55, 64, 81, 104, 113, 92],
+        [49, 64, 78, 87, 103, 121, 120, 101],
+        [72, 92, 95, 98, 112, 100, 103, 99],
+    ], dtype=float)
+
+    # Zig-zag scan: diagonals of constant row+col, alternating direction
+    ZIGZAG = np.array(sorted(range(64), key=lambda k: (
+        k // 8 + k % 8, (k // 8) if (k // 8 + k % 8) % 2 else (k % 8))))
+
+    @staticmethod
+    def dct_matrix(n=8):
+        """Orthonormal DCT-II matrix: coeffs = D @ block @ D.T"""
+        k = np.arange(n)[:, None]
+        i = np.arange(n)[None, :]
+        d = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+        d[0, :] = np.sqrt(1.0 / n)
+        return d
+
+    @staticmethod
+    def dct_quant_matrix(quality):
+        """JPEG (IJG) quality scaling of the luminance table, quality 1..100."""
+        quality = int(np.clip(quality, 1, 100))
+        scale = 5000 / quality if quality < 50 else 200 - 2 * quality
+        q = np.floor((LossyLogic.JPEG_LUMA_QUANT * scale + 50) / 100)
+        return np.clip(q, 1, 255)
+
+    @staticmethod
+    def _dct_events(quantized_blocks):
+        """
+        JPEG baseline symbols of the quantized blocks in stream order:
+        per block a DPCM DC (size category + amplitude), then per non-zero
+        AC coefficient its ZRL (0xF0) symbols and a (zero run, size)
+        symbol + amplitude, then EOB (0x00) unless it ends on coefficient 63.
+        Returns (table: 0 DC / 1 AC, symbol, amplitude, amplitude size).
+        """
+        zz = quantized_blocks.reshape(-1, 64)[:, LossyLogic.ZIGZAG].astype(np.int64)
+        n_blocks = zz.shape[0]
+
+        # DC: difference to previous block
+        dc_diff = np.diff(zz[:, 0], prepend=0)
+        dc_size = np.ceil(np.log2(np.abs(dc_diff) + 1)).astype(np.int64)
+
+        # AC: (zero run, size) per non-zero coefficient
+        blk, pos = np.nonzero(zz[:, 1:])
+        pos = pos + 1
+        amplitude = zz[blk, pos]
+        ac_size = np.ceil(np.log2(np.abs(amplitude) + 1)).astype(np.int64)
+        first_in_block = np.ones(len(blk), dtype=bool)
+        first_in_block[1:] = blk[1:] != blk[:-1]
+        previous = np.where(first_in_block, 0, np.roll(pos, 1))
+        run = pos - previous - 1
+
+        # Runs of 16+ zeros need ZRLs before the coefficient
+        zrl_count = run // 16
+        zrl_blk = np.repeat(blk, zrl_count); zrl_pos = np.repeat(pos, zrl_count)
+        last_pos = np.zeros(n_blocks, dtype=np.int64)
+        last_pos[blk] = pos
+        eob_blk = np.flatnonzero(last_pos < 63)
+
+        # Sort key (block, position, ZRL before its coefficient)
+        block_of = np.concatenate((np.arange(n_blocks), zrl_blk, blk, eob_blk))
+        position = np.concatenate((np.zeros(n_blocks, np.int64), zrl_pos, pos, np.full(len(eob_blk), 64)))
+        after = np.concatenate((np.zeros(n_blocks + len(zrl_blk), np.int64), np.ones(len(blk), np.int64),
+                                np.zeros(len(eob_blk), np.int64)))
+        order = np.lexsort((after, position, block_of))
+        n_ac = len(zrl_blk) + len(blk) + len(eob_blk)
+        table = np.concatenate((np.zeros(n_blocks, np.int64), np.ones(n_ac, np.int64)))[order]
+        symbol = np.concatenate((dc_size, np.full(len(zrl_blk), 0xF0), (run % 16) * 16 + ac_size,
+                                 np.zeros(len(eob_blk), np.int64)))[order]
+        value = np.concatenate((dc_diff, np.zeros(len(zrl_blk), np.int64), amplitude,
+                                np.zeros(len(eob_blk), np.int64)))[order]
+        size = np.concatenate((dc_size, np.zeros(len(zrl_blk), np.int64), ac_size,
+                               np.zeros(len(eob_blk), np.int64)))[order]
+        return table, symbol, value, size
+
+    @staticmethod
+    def dct_encode(quantized_blocks, quality, width, height):
+        """
+        The coded stream (bytes): "DCT1", width, height (u32), quality (u8),
+        the DC and AC Huffman tables as (u16 count, count x (symbol, code
+        length) u8 pairs; the codes are canonical), then the bits of every
+        symbol's code followed by its amplitude (JPEG one's-complement form).
+        """
+        table, symbol, value, size = LossyLogic._dct_events(quantized_blocks)
+        header = [b"DCT1", int(width).to_bytes(4, "big"), int(height).to_bytes(4, "big"), bytes([int(quality)])]
+        code_value = np.zeros(len(symbol), np.int64); code_length = np.zeros(len(symbol), np.int64)
+        for t in (0, 1):
+            mine = table == t
+            symbols, counts = np.unique(symbol[mine], return_counts=True)
+            lengths = LosslessLogic._huffman_code_lengths(counts.tolist()) if len(symbols) else []
+            codes = LosslessLogic._canonical_codes(symbols.tolist(), lengths)
+            header.append(len(symbols).to_bytes(2, "big"))
+            header.append(bytes(b for s, n in zip(symbols.tolist(), lengths) for b in (s, n)))
+            lut_value = np.zeros(256, np.int64); lut_length = np.zeros(256, np.int64)
+            for s, code in codes.items():
+                lut_value[s] = int(code, 2); lut_length[s] = len(code)
+            code_value[mine] = lut_value[symbol[mine]]; code_length[mine] = lut_length[symbol[mine]]
+
+        # Fields in order: code, amplitude, code, amplitude, ...
+        amplitude = np.where(value < 0, value + (1 << size) - 1, value)
+        values = np.column_stack((code_value, amplitude)).ravel()
+        lengths = np.column_stack((code_length, size)).ravel()
+        field = np.repeat(np.arange(len(values)), lengths)
+        within = np.arange(len(field)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        bits = (values[field] >> (lengths[field] - 1 - within)) & 1
+        return b"".join(header) + np.packbits(bits.astype(np.uint8)).tobytes()
+
+    @staticmethod
+    def dct_decode(data):
+        """Inverse of dct_encode: (quantized blocks (bh, bw, 8, 8), quality, width, height)."""
+        if data[:4] != b"DCT1":
+            raise ValueError("Not a DCT stream")
+        width = int.from_bytes(data[4:8], "big"); height = int.from_bytes(data[8:12], "big")
+        quality = data[12]
+        pos = 13; tables = []
+        for _ in range(2):
+            count = int.from_bytes(data[pos:pos + 2], "big"); pos += 2
+            pairs = data[pos:pos + 2 * count]; pos += 2 * count
+            codes = LosslessLogic._canonical_codes(list(pairs[0::2]), list(pairs[1::2]))
+            tables.append(({code: s for s, code in codes.items()}, sorted({len(c) for c in codes.values()})))
+        bits = (np.unpackbits(np.frombuffer(data, np.uint8, offset=pos)) + 48).tobytes().decode("ascii")
+
+        n = LossyLogic.BLOCK
+        bh, bw = -(-height // n), -(-width // n)
+        zz = [0] * (bh * bw * 64)
+        (dc_codes, dc_widths), (ac_codes, ac_widths) = tables
+        pos = 0; dc = 0
+        try:
+            for base in range(0, len(zz), 64):
+                for w in dc_widths:
+                    s = dc_codes.get(bits[pos:pos + w])
+                    if s is not None: break
+                else: raise ValueError
+                pos += w
+                if s:
+                    v = int(bits[pos:pos + s], 2); pos += s
+                    dc += v if v >> (s - 1) else v - (1 << s) + 1
+                zz[base] = dc
+                k = 1
+                while k < 64:
+                    for w in ac_widths:
+                        s = ac_codes.get(bits[pos:pos + w])
+                        if s is not None: break
+                    else: raise ValueError
+                    pos += w
+                    if s == 0: break # EOB
+                    k += s >> 4
+                    s &= 15
+                    if s:
+                        v = int(bits[pos:pos + s], 2); pos += s
+                        zz[base + k] = v if v >> (s - 1) else v - (1 << s) + 1
+                    k += 1 # ZRL (0xF0): 15 zeros + this one
+        except (ValueError, IndexError):
+            raise ValueError("Corrupt DCT stream")
+        quantized = np.zeros((bh * bw, 64), np.int32)
+        quantized[:, LossyLogic.ZIGZAG] = np.array(zz, np.int32).reshape(-1, 64)
+        return quantized.reshape(bh, bw, n, n), quality, width, height
+
+    @staticmethod
+    def _dct_reconstruct(quantized, quality, width, height):
+        n = LossyLogic.BLOCK
+        bh, bw = quantized.shape[:2]
+        d = LossyLogic.dct_matrix(n)
+        restored = d.T @ (quantized * LossyLogic.dct_quant_matrix(quality)) @ d + 128.0
+        restored = restored.swapaxes(1, 2).reshape(bh * n, bw * n)[:height, :width]
+        return np.clip(np.round(restored), 0, 255).astype(np.uint8)
+
+    @staticmethod
+    def dct_decompress(data):
+        """Gray image of a dct_encode stream."""
+        return Image.fromarray(LossyLogic._dct_reconstruct(*LossyLogic.dct_decode(data)), mode="L")
+
+    @staticmethod
+    def dct_compress(original_image_pil, quality, file_path_on_disk, stats=None):
+        """
+        Blockwise 8x8 DCT transform coding.
+        Returns (reconstructed image, MSE, CR) like run_quantization. CR is
+        measured on the coded stream (dct_encode), which is also kept in
+        the image's info["dct_stream"] for saving; dct_decompress reads it.
+        """
+        if stats is None: stats = NULL_STATS
+
+        # 1. Prepare Data (pad to whole blocks by repeating the edges)
+        with stats.stage("prepare") as st:
+            img_np = np.array(original_image_pil.convert("L"), dtype=float)
+            height, width = img_np.shape
+            n = LossyLogic.BLOCK
+            padded = np.pad(img_np, ((0, -height % n), (0, -width % n)), mode="edge")
+            bh, bw = padded.shape[0] // n, padded.shape[1] // n
+            st.symbols = bh * bw
+
+        if file_path_on_disk and os.path.exists(file_path_on_disk):
+            original_size_bytes = os.path.getsize(file_path_on_disk)
+        else:
+            original_size_bytes = height * width
+
+        # 2. Forward DCT of all blocks at once: (bh, bw, 8, 8) batched matmul
+        with stats.stage("forward dct", symbols=bh * bw):
+            blocks = padded.reshape(bh, n, bw, n).swapaxes(1, 2) - 128.0
+            d = LossyLogic.dct_matrix(n)
+            coeffs = d @ blocks @ d.T
+
+        # 3. Quantize
+        with stats.stage("quantize", symbols=coeffs.size):
+            q = LossyLogic.dct_quant_matrix(quality)
+            quantized = np.round(coeffs / q).astype(np.int32)
+
+        # 4. Zig-zag / run-length / Huffman coded stream
+        with stats.stage("zigzag + entropy code", symbols=coeffs.size) as st:
+            stream = LossyLogic.dct_encode(quantized, int(np.clip(quality, 1, 100)), width, height)
+            compressed_size_bytes = len(stream)
+            st.bytes_out = compressed_size_bytes
+
+        # 5. Reconstruct (what dct_decompress gives back for the stream)
+        with stats.stage("inverse dct", symbols=bh * bw):
+            restored = LossyLogic._dct_reconstruct(quantized, int(np.clip(quality, 1, 100)), width, height)
+            reconstructed_image_pil = Image.fromarray(restored, mode="L")
+            reconstructed_image_pil.info["dct_stream"] = stream
+
+        with stats.stage("mse", symbols=restored.size):
+            mse = LossyLogic.quantization_mse(img_np, restored)
+        cr = original_size_bytes / compressed_size_bytes if compressed_size_bytes > 0 else 0.0
+        return reconstructed_image_pil, mse, cr
+
+def _quantize_file_job(job):
+    # Module-level so the process pool can pickle it
+    return LossyLogic.quantize_file(*job)
+
+
+# ===================== Image Sequences =====================
+class SequenceQuantizer:
+    """
+    Quantizes consecutive frames (video, burst shots) without retraining a
+    table per frame. Recent tables are cached by histogram signature; each
+    frame takes the nearest one and:
+      - reuses it as is when the drift is below reuse_drift,
+      - warm-starts refine_iterations Lloyd passes from it below retrain_drift,
+      - runs the full LBG split otherwise (scene cut / first frame).
+    """
+
+    def __init__(self, bit_size, reuse_drift=0.02, retrain_drift=0.25, refine_iterations=3,
+                 cache_size=8, full_scale=256, epsilon=1.0):
+        self.bit_size = bit_size
+        self.reuse_drift = reuse_drift
+        self.retrain_drift = retrain_drift
+        self.refine_iterations = refine_iterations
+        self.cache_size = cache_size
+        self.full_scale = full_scale
+        self.epsilon = epsilon
+        self.cache = []  # [(signature, table)], most recently used last
+        self.counts = {"reused": 0, "refined": 0, "trained": 0}
+
+    def table_for(self, histogram):
+        """Returns (table, action) for one frame's gray histogram."""
+        signature = LossyLogic.histogram_signature(histogram)
+
+        # 1) Nearest cached table
+        best, drift = None, float("inf")
+        for i, (cached_signature, _) in enumerate(self.cache):
+            d = LossyLogic.histogram_drift(signature, cached_signature)
+            if d < drift:
+                best, drift = i, d
+
+        # 2) Reuse / warm-start / train
+        if best is not None and drift < self.reuse_drift:
+            entry = self.cache.pop(best)
+            self.cache.append(entry)  # Keep the stored signature: drift can't creep
+            action, table = "reused", entry[1]
+        else:
+            if best is not None and drift < self.retrain_drift:
+                _, cached_table = self.cache.pop(best)
+                action = "refined"
+                table = LossyLogic.refine_table(cached_table, histogram, self.refine_iterations, self.full_scale)
+            else:
+                action = "trained"
+                table = LossyLogic.table_from_histogram(self.bit_size, histogram, self.full_scale, self.epsilon)
+            self.cache.append((signature, table))
+            del self.cache[:-self.cache_size]
+
+        self.counts[action] += 1
+        return table, action
+
+    def quantize(self, image_pil, file_path_on_disk=None, size_estimate="png", stats=None):
+        """run_quantization for the next frame. Returns (image, mse, cr, action)."""
+        if stats is None: stats = NULL_STATS
+        img_gray = image_pil.convert("L")
+        with stats.stage("sequence table", bytes_in=img_gray.width * img_gray.height) as st:
+            histogram = LossyLogic.gray_histogram(img_gray, self.full_scale)
+            table, action = self.table_for(histogram)
+            st.symbols = len(table)
+        image, mse, cr = LossyLogic.run_quantization(img_gray, self.bit_size, file_path_on_disk, table=table,
+                                                     size_estimate=size_estimate, stats=stats)
+        return image, mse, cr, action